@@ -1,6 +1,26 @@
 """Edge agent package implementing resilient edge deployment capabilities."""
 
-from .agent import EdgeAgent
-from .config import AgentConfig
+from __future__ import annotations
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:  # pragma: no cover - resolved lazily at runtime
+    from .agent import EdgeAgent
+    from .config import AgentConfig
 
 __all__ = ["EdgeAgent", "AgentConfig"]
+
+_LAZY_EXPORTS = {
+    "EdgeAgent": ".agent",
+    "AgentConfig": ".config",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -1,20 +1,30 @@
 from __future__ import annotations
 
-import logging
-import shutil
 import time
 import uuid
-from dataclasses import dataclass, field
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, replace
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
 
 from .backend import FleetBackendProtocol, SyncResult
+from .bandwidth import BandwidthDeferred, BandwidthScheduler
 from .cache import CacheItem, OfflineCache
-from .config import AgentConfig
+from .clock import SYSTEM_CLOCK, Clock
+from .config import TUNABLE_FIELDS, AgentConfig, ConfigError, ConfigWatcher
 from .connectivity import ConnectivityMonitor
-from .management import ManagementCommand, RemoteManagement
+from .delta import DeltaBaseMismatch, DeltaEncoder
 from .monitoring import TelemetryBuffer
-from .update import UpdateManager, UpdateState
+from .update import UpdateState
+
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    import logging
+
+    from .local_query import CacheReader
+    from .log_pipeline import LogPipeline
+    from .management import RemoteManagement
+    from .metrics_history import MetricsHistory
+    from .update import UpdateManager
 
 
 @dataclass
@@ -26,6 +36,7 @@ class AgentState:
     events_sent: int = 0
     events_cached: int = 0
     rejected_events: int = 0
+    trimmed_events: int = 0
 
 
 class EdgeAgent:
@@ -37,39 +48,123 @@ class EdgeAgent:
         backend: FleetBackendProtocol,
         update_state: Optional[UpdateState] = None,
         cache: Optional[OfflineCache] = None,
+        clock: Optional[Clock] = None,
+        config_watcher: Optional[ConfigWatcher] = None,
     ) -> None:
         self._config = config
-        self._config.ensure_directories()
-        cache_path = cache.path if cache else self._config.cache_path
-        self._cache = cache or OfflineCache(cache_path)
-        self._backend = backend
-        self._connectivity = ConnectivityMonitor(backend=backend, site_id=config.site_id)
-        self._management = RemoteManagement(config.log_directory, config.diag_log_lines)
-        self._telemetry = TelemetryBuffer()
+        self._config_watcher = config_watcher
+        self._clock = clock or SYSTEM_CLOCK
+        if cache is None:
+            self._config.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache = OfflineCache(
+                self._config.cache_path,
+                clock=self._clock,
+                integrity_check_seconds=self._config.cache_integrity_check_seconds,
+            )
+        self._cache = cache
+        self._scheduler = BandwidthScheduler(backend, config.link_budget_bytes_per_second, clock=self._clock)
+        self._backend: FleetBackendProtocol = self._scheduler
+        self._connectivity = ConnectivityMonitor(backend=self._scheduler, site_id=config.site_id, clock=self._clock)
+        self._telemetry = TelemetryBuffer(clock=self._clock)
         self._state = AgentState()
-        updates_dir = self._config.data_directory / "updates"
-        updates_dir.mkdir(parents=True, exist_ok=True)
+        self._update_state = update_state or UpdateState(current_version="0.0.0")
+        self._management_instance: Optional[RemoteManagement] = None
+        self._update_manager_instance: Optional[UpdateManager] = None
+        self._logger_instance: Optional[logging.Logger] = None
+        self._log_pipeline: Optional[LogPipeline] = None
+        self._metrics_history_instance: Optional[MetricsHistory] = None
+        self._delta_encoders: Dict[str, DeltaEncoder] = {}
+        # last, so a recovery warning can already use the lazily created logger
+        self._record_cache_recovery()
 
-        def install_callback(artifact_path: Path) -> None:
-            destination = updates_dir / artifact_path.name
-            shutil.copy(artifact_path, destination)
+    def _record_cache_recovery(self) -> None:
+        report = self._cache.recovery_report
+        self._telemetry.gauge("cache_recovery_seconds", report.duration_seconds)
+        self._telemetry.gauge("cache_in_flight_batches_recovered", float(len(report.in_flight_batches)))
+        if report.quarantined_file is not None:
+            self._telemetry.gauge("cache_rows_quarantined", float(report.quarantined_rows))
+            self._logger.warning(
+                "Offline cache failed integrity check; moved to %s and salvaged readable rows (%d lost)",
+                report.quarantined_file,
+                report.quarantined_rows,
+            )
+
+    @property
+    def _management(self) -> RemoteManagement:
+        if self._management_instance is None:
+            from .management import RemoteManagement
+
+            self._management_instance = RemoteManagement(self._config.log_directory, self._config.diag_log_lines)
+        return self._management_instance
+
+    @property
+    def _update_manager(self) -> UpdateManager:
+        if self._update_manager_instance is None:
+            import shutil
+
+            from .update import UpdateManager
+
+            updates_dir = self._config.data_directory / "updates"
+            updates_dir.mkdir(parents=True, exist_ok=True)
+
+            def install_callback(artifact_path: Path) -> None:
+                destination = updates_dir / artifact_path.name
+                shutil.copy(artifact_path, destination)
+
+            self._update_manager_instance = UpdateManager(
+                secret_key=self._config.secret_key,
+                state=self._update_state,
+                install_callback=install_callback,
+            )
+        return self._update_manager_instance
+
+    @property
+    def _metrics_history(self) -> MetricsHistory:
+        if self._metrics_history_instance is None:
+            from .metrics_history import MetricsHistory
 
-        self._update_manager = UpdateManager(
-            secret_key=config.secret_key,
-            state=update_state or UpdateState(current_version="0.0.0"),
-            install_callback=install_callback,
+            self._metrics_history_instance = MetricsHistory(self._config.data_directory / "metrics-history.bin")
+        return self._metrics_history_instance
+
+    @property
+    def _logger(self) -> logging.Logger:
+        if self._logger_instance is None:
+            self._logger_instance = self._setup_logging()
+        return self._logger_instance
+
+    def _setup_logging(self) -> logging.Logger:
+        import logging
+
+        from .log_pipeline import LogPipeline
+
+        # one child logger per agent: handlers on the shared "edge_agent" logger would
+        # send every agent's records to every other agent's file in the same process
+        logger = logging.getLogger(f"edge_agent.agent-{id(self):x}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self._config.log_directory.mkdir(parents=True, exist_ok=True)
+        self._log_pipeline = LogPipeline(
+            self._config.log_directory / "edge-agent.log",
+            max_bytes=self._config.log_max_bytes,
+            backup_count=self._config.log_backup_count,
+            interval_seconds=self._config.log_rotation_interval_seconds,
+            compress=self._config.log_compress_rotated,
+            repeat_limit=self._config.log_repeat_limit,
         )
-        self._logger = logging.getLogger("edge_agent")
-        self._setup_logging()
-
-    def _setup_logging(self) -> None:
-        log_file = self._config.log_directory / "edge-agent.log"
-        handler = logging.FileHandler(log_file)
-        formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-        handler.setFormatter(formatter)
-        self._logger.setLevel(logging.INFO)
-        if not self._logger.handlers:
-            self._logger.addHandler(handler)
+        logger.addHandler(self._log_pipeline.handler)
+        return logger
+
+    def _record_bandwidth_usage(self) -> None:
+        for traffic_class, rate in self._scheduler.collect_rates().items():
+            self._telemetry.gauge(f"bandwidth_{traffic_class}_bytes_per_second", rate)
+
+    def _record_logging_overhead(self) -> None:
+        if self._log_pipeline is None or self._logger_instance is None:
+            return
+        stats = self._log_pipeline.collect_stats(self._logger_instance)
+        self._telemetry.gauge("log_emit_ms_per_cycle", stats.emit_seconds * 1000)
+        if stats.dropped:
+            self._telemetry.increment("log_records_dropped", stats.dropped)
 
     @property
     def state(self) -> AgentState:
@@ -81,12 +176,52 @@ class EdgeAgent:
 
     @property
     def current_version(self) -> str:
-        return self._update_manager.current_version
+        return self._update_state.current_version
+
+    @property
+    def config(self) -> AgentConfig:
+        return self._config
+
+    def apply_config(self, config: AgentConfig) -> List[str]:
+        """Apply the tunable fields of ``config`` atomically and return the names that changed."""
+        config.validate()
+        changed = [item.name for item in fields(AgentConfig) if getattr(config, item.name) != getattr(self._config, item.name)]
+        fixed = [name for name in changed if name not in TUNABLE_FIELDS]
+        if fixed:
+            self._logger.warning("Ignoring config changes that require a restart: %s", ", ".join(fixed))
+        applied = [name for name in changed if name in TUNABLE_FIELDS]
+        if not applied:
+            return []
+        self._config = replace(self._config, **{name: getattr(config, name) for name in applied})
+        if "diag_log_lines" in applied and self._management_instance is not None:
+            # updated in place: the instance may own a running profiler
+            self._management_instance.set_diag_log_lines(self._config.diag_log_lines)
+        if "link_budget_bytes_per_second" in applied:
+            self._scheduler.set_link_budget(self._config.link_budget_bytes_per_second)
+        self._telemetry.increment("config_reloads")
+        self._logger.info("Applied config changes: %s", ", ".join(applied))
+        return applied
+
+    def _reload_config_if_changed(self) -> None:
+        if self._config_watcher is None:
+            return
+        try:
+            config = self._config_watcher.poll()
+        except ConfigError as exc:
+            self._telemetry.increment("config_reload_failures")
+            self._logger.error("Config reload rejected, keeping current settings: %s", exc)
+            return
+        if config is not None:
+            self.apply_config(config)
+
+    def open_local_reader(self) -> CacheReader:
+        """Read-only access to pending and recently delivered payloads for local consumers."""
+        return self._cache.open_reader()
 
     def ingest_payload(self, payload: Dict) -> None:
         envelope = {
             "payload": payload,
-            "ingested_at": time.time(),
+            "ingested_at": self._clock.time(),
             "site_id": self._config.site_id,
             "uuid": uuid.uuid4().hex,
         }
@@ -95,55 +230,104 @@ class EdgeAgent:
         self._telemetry.increment("events_ingested")
 
     def process_cycle(self) -> None:
+        self._reload_config_if_changed()
         self._telemetry.gauge("cache_depth", float(self._cache.count()))
         self._telemetry.gauge("cache_size_bytes", float(self._cache.total_size_bytes()))
-        self._cache.trim_to_limit(self._config.offline_cache_limit_bytes)
+        self._telemetry.gauge("cache_delivered_bytes", float(self._cache.delivered_size_bytes()))
+        trimmed = self._cache.trim_to_limit(self._config.offline_cache_limit_bytes)
+        if trimmed:
+            self._state.trimmed_events += trimmed
+            self._state.events_cached = self._cache.count()
+            self._telemetry.increment("events_trimmed", trimmed)
+        self._cache.prune_delivered(self._clock.time() - self._config.delivered_retention_seconds)
         connectivity_state = self._connectivity.evaluate()
 
-        if connectivity_state.is_online:
-            self._handle_online_cycle()
-        else:
-            self._handle_offline_cycle()
+        with self._timed_phase("total"):
+            if connectivity_state.is_online:
+                self._handle_online_cycle()
+            else:
+                self._handle_offline_cycle()
+        self._record_logging_overhead()
+        self._record_bandwidth_usage()
 
     def _handle_online_cycle(self) -> None:
-        if self._state.offline_since:
-            duration = time.time() - self._state.offline_since
+        if self._state.offline_since is not None:
+            duration = self._clock.time() - self._state.offline_since
             self._telemetry.gauge("offline_duration_seconds", duration)
             self._state.offline_since = None
             self._logger.info("Recovered connectivity after %.2fs", duration)
-        self._flush_payloads()
-        self._sync_inventory_if_needed()
-        self._flush_metrics_if_needed(force=True)
-        self._poll_remote_commands()
-        self._poll_updates_if_due()
+        with self._timed_phase("flush"):
+            self._flush_payloads()
+        with self._timed_phase("inventory"):
+            self._sync_inventory_if_needed()
+        with self._timed_phase("metrics"):
+            self._flush_metrics_if_needed(force=True)
+        with self._timed_phase("commands"):
+            self._poll_remote_commands()
+            self._post_finished_profiles()
+        with self._timed_phase("updates"):
+            self._poll_updates_if_due()
 
     def _handle_offline_cycle(self) -> None:
-        if not self._state.offline_since:
-            self._state.offline_since = time.time()
+        if self._state.offline_since is None:
+            self._state.offline_since = self._clock.time()
             self._logger.warning("Connectivity lost, entering offline mode")
-        self._flush_metrics_if_needed(force=False)
+        with self._timed_phase("metrics"):
+            self._flush_metrics_if_needed(force=False)
+
+    @contextmanager
+    def _timed_phase(self, phase: str) -> Iterator[None]:
+        # wall time, not the injected clock: this measures the agent's own overhead
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._telemetry.gauge(f"cycle_{phase}_ms", (time.perf_counter() - started) * 1000)
 
     def _flush_payloads(self) -> None:
+        # batches left unacknowledged by a failed send or a crash go out first, unchanged
+        for batch_id, batch in self._cache.in_flight_batches():
+            if not self._send_batch(batch_id, batch):
+                return
         batch = self._cache.get_batch(self._config.max_batch_size)
         while batch:
-            payload = self._format_batch(batch)
-            try:
-                result = self._backend.send_batch(self._config.site_id, payload)
-            except Exception as exc:
-                self._logger.error("Failed to send batch: %s", exc)
-                break
-            self._handle_sync_result(batch, result)
+            batch_id = uuid.uuid4().hex
+            self._cache.mark_in_flight(batch_id, [item.id for item in batch])
+            if not self._send_batch(batch_id, batch):
+                return
             batch = self._cache.get_batch(self._config.max_batch_size)
 
+    def _send_batch(self, batch_id: str, batch: List[CacheItem]) -> bool:
+        payload = self._format_batch(batch)
+        try:
+            result = self._backend.send_batch(
+                self._config.site_id,
+                payload,
+                batch_token=batch_id,
+                stream_id=self._cache.stream_id,
+            )
+        except BandwidthDeferred:
+            # the batch stays in flight and goes out first next cycle
+            self._telemetry.increment("payload_batches_deferred")
+            return False
+        except Exception as exc:
+            self._logger.error("Failed to send batch: %s", exc)
+            return False
+        self._handle_sync_result(batch, result)
+        self._cache.release_in_flight(batch_id)
+        return True
+
     def _handle_sync_result(self, batch: List[CacheItem], result: SyncResult) -> None:
         acknowledged = set(result.acknowledged)
-        self._cache.remove(acknowledged)
+        self._cache.mark_delivered(acknowledged, retain=self._config.delivered_retention_seconds > 0)
         rejected_ids = set(result.rejected.keys())
         if rejected_ids:
             self._cache.remove(rejected_ids)
             self._state.rejected_events += len(rejected_ids)
             self._telemetry.increment("events_rejected", len(rejected_ids))
-            self._logger.warning("Rejected %d events: %s", len(rejected_ids), result.rejected)
+            # log a bounded sample; formatting the whole dict scaled with batch size
+            sample = dict(list(result.rejected.items())[:5])
+            self._logger.warning("Rejected %d events, e.g. %s", len(rejected_ids), sample)
         sent_count = len(acknowledged)
         self._state.events_sent += sent_count
         self._telemetry.increment("events_sent", sent_count)
@@ -158,58 +342,108 @@ class EdgeAgent:
         return formatted
 
     def _sync_inventory_if_needed(self) -> None:
-        now = time.time()
+        now = self._clock.time()
         if now - self._state.last_inventory_sync < self._config.inventory_refresh_hours * 3600:
             return
         inventory = self._management.collect_inventory()
         try:
-            self._backend.post_inventory(self._config.site_id, inventory)
+            self._post_document("inventory", inventory)
             self._state.last_inventory_sync = now
             self._logger.info("Inventory sync completed")
         except Exception as exc:
             self._logger.error("Failed to sync inventory: %s", exc)
 
+    def _post_document(self, kind: str, document: Dict) -> None:
+        """Upload inventory or diagnostics as a delta against the last acknowledged copy."""
+        encoder = self._delta_encoders.get(kind)
+        if encoder is None:
+            encoder = DeltaEncoder(self._config.data_directory / f"{kind}-acked.json")
+            self._delta_encoders[kind] = encoder
+        post = self._backend.post_inventory if kind == "inventory" else self._backend.post_diagnostics
+        try:
+            post(self._config.site_id, encoder.encode(document))
+        except DeltaBaseMismatch:
+            # the backend no longer holds our baseline; fall back to a full upload
+            self._telemetry.increment(f"{kind}_full_resyncs")
+            encoder.reset()
+            post(self._config.site_id, encoder.encode(document))
+        encoder.acknowledge(document)
+
     def _flush_metrics_if_needed(self, force: bool) -> None:
         if not force and self._telemetry.seconds_since_flush < self._config.telemetry_push_interval_seconds:
             return
+        gauges = self._telemetry.gauge_keys
         metrics = self._telemetry.flush()
         if not metrics or (len(metrics) == 1 and "timestamp" in metrics):
             return
+        # every snapshot lands in the on-disk history first, so an outage only delays it
+        history = self._metrics_history
+        history.record(metrics, gauges)
+        if not force:
+            return
         try:
+            self._backfill_metrics(history, metrics["timestamp"])
             self._backend.post_metrics(self._config.site_id, metrics)
-            self._state.last_metrics_flush = time.time()
+            history.mark_acked(metrics["timestamp"])
+            self._state.last_metrics_flush = self._clock.time()
         except Exception:
-            # metrics will be refilled on next increment; losing one snapshot acceptable
+            # the snapshot stays in the history and is backfilled after the next success
             self._logger.debug("Metric flush skipped due to backend failure", exc_info=True)
 
+    def _backfill_metrics(self, history: MetricsHistory, timestamp: float) -> None:
+        current_bucket = timestamp - timestamp % history.finest_resolution
+        if history.acked_until >= current_bucket:
+            return
+        series = history.backfill(history.acked_until, current_bucket)
+        if series:
+            self._backend.post_metrics_backfill(self._config.site_id, series)
+            self._telemetry.increment("metrics_buckets_backfilled", len(series))
+            self._logger.info("Backfilled %d metric buckets", len(series))
+
     def _poll_remote_commands(self) -> None:
         try:
             raw_commands = self._backend.fetch_commands(self._config.site_id)
         except Exception as exc:
             self._logger.error("Failed to fetch commands: %s", exc)
             return
-        commands = [ManagementCommand(name=item["command"], parameters=item.get("parameters", {})) for item in raw_commands]
-        if not commands:
+        if not raw_commands:
             return
+        from .management import ManagementCommand
+
+        commands = [ManagementCommand(name=item["command"], parameters=item.get("parameters", {})) for item in raw_commands]
         results = self._management.execute_commands(commands)
         for result in results:
             try:
                 if "diagnostics" in result:
-                    self._backend.post_diagnostics(self._config.site_id, result["diagnostics"])
+                    self._post_document("diagnostics", result["diagnostics"])
                 if "inventory" in result:
-                    self._backend.post_inventory(self._config.site_id, result["inventory"])
+                    self._post_document("inventory", result["inventory"])
             except Exception as exc:  # pragma: no cover - defensive logging
                 self._logger.error("Failed to post command result: %s", exc)
-        output_file = Path(self._config.data_directory) / "command-results.json"
+        output_file = self._config.data_directory / "command-results.json"
         self._management.write_remote_command_result(results, output_file)
         self._logger.info("Executed %d remote commands", len(results))
 
+    def _post_finished_profiles(self) -> None:
+        if self._management_instance is None:
+            return
+        for profile in self._management_instance.finished_profiles():
+            try:
+                # a one-off report: it must not become the diagnostics delta baseline
+                self._backend.post_diagnostics(self._config.site_id, profile)
+                self._logger.info("Uploaded profile with %d samples", profile["profile"]["samples"])
+            except Exception as exc:
+                self._logger.error("Failed to post profile: %s", exc)
+
     def _poll_updates_if_due(self) -> None:
-        now = time.time()
+        now = self._clock.time()
         if now - self._state.last_update_poll < self._config.update_poll_interval_seconds:
             return
+        try:
+            manifest = self._backend.get_update_manifest(self._config.site_id)
+        except BandwidthDeferred:
+            return
         self._state.last_update_poll = now
-        manifest = self._backend.get_update_manifest(self._config.site_id)
         if not manifest:
             return
         if not self._update_manager.needs_update(manifest.version):
@@ -223,9 +457,16 @@ class EdgeAgent:
             self._logger.error("Update application failed: %s", exc)
 
     def close(self) -> None:
+        if self._management_instance is not None:
+            self._management_instance.stop_profiling()
         self._cache.close()
+        if self._metrics_history_instance is not None:
+            self._metrics_history_instance.close()
+        if self._log_pipeline is not None and self._logger_instance is not None:
+            self._logger_instance.removeHandler(self._log_pipeline.handler)
+            self._log_pipeline.stop()
 
     def run(self, cycles: int = 1) -> None:
         for _ in range(cycles):
             self.process_cycle()
-            time.sleep(self._config.sync_interval_seconds)
+            self._clock.sleep(self._config.sync_interval_seconds)
@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import random
 import threading
-import time
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Protocol
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+
+from .clock import SYSTEM_CLOCK, Clock
+from .dedup import BoundedResultCache, SequenceRangeSet
+from .delta import DeltaBaseMismatch, apply_patch, content_hash, is_delta, stable_sections
 
 
 @dataclass
@@ -26,31 +29,60 @@ class FleetBackendProtocol(Protocol):
 
     def ping(self, site_id: str) -> bool: ...
 
-    def send_batch(self, site_id: str, items: Iterable[Dict]) -> SyncResult: ...
+    def send_batch(
+        self,
+        site_id: str,
+        items: Iterable[Dict],
+        batch_token: Optional[str] = None,
+        stream_id: Optional[str] = None,
+    ) -> SyncResult:
+        """Deliver a batch idempotently per ``batch_token`` and per ``(stream_id, id)``."""
+        ...
 
     def fetch_commands(self, site_id: str) -> List[Dict]: ...
 
     def get_update_manifest(self, site_id: str) -> Optional[UpdateManifest]: ...
 
-    def post_inventory(self, site_id: str, inventory: Dict) -> None: ...
+    def post_inventory(self, site_id: str, inventory: Dict) -> None:
+        """Store a full inventory or apply a delta, raising :class:`DeltaBaseMismatch` on a stale base."""
+        ...
 
-    def post_diagnostics(self, site_id: str, diagnostics: Dict) -> None: ...
+    def post_diagnostics(self, site_id: str, diagnostics: Dict) -> None:
+        """Like :meth:`post_inventory`; reports with a ``profile`` key never become the delta base."""
+        ...
 
     def post_metrics(self, site_id: str, metrics: Dict) -> None: ...
 
+    def post_metrics_backfill(self, site_id: str, series: List[Dict]) -> None: ...
+
 
 class MockFleetBackend(FleetBackendProtocol):
     """In-memory backend emulation used for tests and simulations."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        rejection_rate: float = 0.01,
+        seed: Optional[int] = None,
+        clock: Optional[Clock] = None,
+    ) -> None:
         self._online = True
+        self._rejection_rate = rejection_rate
+        self._random = random.Random(seed)
+        self._clock = clock or SYSTEM_CLOCK
         self.received_batches: List[Dict] = []
         self.received_inventory: List[Dict] = []
         self.received_diagnostics: List[Dict] = []
         self.received_metrics: List[Dict] = []
+        self.received_metrics_backfill: List[Dict] = []
         self._commands: List[Dict] = []
         self._command_lock = threading.Lock()
         self._manifest: Optional[UpdateManifest] = None
+        self._delivered: Dict[Tuple[str, Optional[str]], SequenceRangeSet] = {}
+        self._batch_results: BoundedResultCache[SyncResult] = BoundedResultCache()
+        self._documents: Dict[Tuple[str, str], Dict] = {}
+        self.duplicates_dropped = 0
+        self.replayed_batches = 0
+        self.delta_uploads = 0
 
     def set_online(self, online: bool) -> None:
         self._online = online
@@ -65,19 +97,39 @@ class MockFleetBackend(FleetBackendProtocol):
     def ping(self, site_id: str) -> bool:  # noqa: ARG002 - site_id useful for real implementations
         return self._online
 
-    def send_batch(self, site_id: str, items: Iterable[Dict]) -> SyncResult:  # noqa: ARG002
+    def send_batch(
+        self,
+        site_id: str,
+        items: Iterable[Dict],
+        batch_token: Optional[str] = None,
+        stream_id: Optional[str] = None,
+    ) -> SyncResult:
         if not self._online:
             raise ConnectionError("backend offline")
+        if batch_token is not None:
+            previous = self._batch_results.get(batch_token)
+            if previous is not None:
+                self.replayed_batches += 1
+                return previous
+        delivered = self._delivered.setdefault((site_id, stream_id), SequenceRangeSet())
         acknowledged: List[int] = []
         rejected: Dict[int, str] = {}
         for item in items:
             message_id = item["id"]
-            if random.random() < 0.01:  # simulate rare rejection
+            if stream_id is not None and message_id in delivered:
+                self.duplicates_dropped += 1
+                acknowledged.append(message_id)
+            elif self._random.random() < self._rejection_rate:  # simulate rare rejection
                 rejected[message_id] = "corrupted payload"
             else:
                 self.received_batches.append(item)
                 acknowledged.append(message_id)
-        return SyncResult(acknowledged=acknowledged, rejected=rejected)
+                if stream_id is not None:
+                    delivered.add(message_id)
+        result = SyncResult(acknowledged=acknowledged, rejected=rejected)
+        if batch_token is not None:
+            self._batch_results.put(batch_token, result)
+        return result
 
     def fetch_commands(self, site_id: str) -> List[Dict]:  # noqa: ARG002
         with self._command_lock:
@@ -92,19 +144,50 @@ class MockFleetBackend(FleetBackendProtocol):
         self._manifest = None
         return manifest
 
-    def post_inventory(self, site_id: str, inventory: Dict) -> None:  # noqa: ARG002
+    def post_inventory(self, site_id: str, inventory: Dict) -> None:
         if not self._online:
             raise ConnectionError("backend offline")
-        self.received_inventory.append(inventory)
+        self.received_inventory.append(self._receive_document("inventory", site_id, inventory))
 
-    def post_diagnostics(self, site_id: str, diagnostics: Dict) -> None:  # noqa: ARG002
+    def post_diagnostics(self, site_id: str, diagnostics: Dict) -> None:
         if not self._online:
             raise ConnectionError("backend offline")
-        diagnostics = {**diagnostics, "timestamp": time.time()}
+        if "profile" in diagnostics:
+            diagnostics = dict(diagnostics)
+        else:
+            diagnostics = self._receive_document("diagnostics", site_id, diagnostics)
+        diagnostics["timestamp"] = self._clock.time()
         self.received_diagnostics.append(diagnostics)
 
+    def forget_documents(self, site_id: str) -> None:
+        """Drop stored inventory/diagnostics, as a backend restored from an old snapshot would."""
+        for key in [key for key in self._documents if key[0] == site_id]:
+            del self._documents[key]
+
+    def _receive_document(self, kind: str, site_id: str, body: Dict) -> Dict:
+        if not is_delta(body):
+            document = stable_sections(body)
+        else:
+            stored = self._documents.get((site_id, kind))
+            if stored is None or content_hash(stored) != body["base"]:
+                raise DeltaBaseMismatch(f"{kind} base {body['base']} unknown")
+            document = apply_patch(stored, body["patch"])
+            if content_hash(document) != body["hash"]:
+                raise DeltaBaseMismatch(f"{kind} delta does not produce {body['hash']}")
+            self.delta_uploads += 1
+        self._documents[(site_id, kind)] = document
+        received = dict(document)
+        if "timestamp" in body:
+            received["timestamp"] = body["timestamp"]
+        return received
+
     def post_metrics(self, site_id: str, metrics: Dict) -> None:  # noqa: ARG002
         if not self._online:
             raise ConnectionError("backend offline")
-        metrics = {**metrics, "timestamp": time.time()}
+        metrics = {**metrics, "timestamp": self._clock.time()}
         self.received_metrics.append(metrics)
+
+    def post_metrics_backfill(self, site_id: str, series: List[Dict]) -> None:  # noqa: ARG002
+        if not self._online:
+            raise ConnectionError("backend offline")
+        self.received_metrics_backfill.extend(series)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+from .backend import FleetBackendProtocol, SyncResult, UpdateManifest
+from .clock import SYSTEM_CLOCK, Clock
+
+# relative share of the link each traffic class is guaranteed under contention
+TRAFFIC_WEIGHTS: Dict[str, int] = {
+    "commands": 8,
+    "metrics": 4,
+    "payload": 4,
+    "inventory": 2,
+    "diagnostics": 2,
+    "updates": 1,
+}
+# bulk classes are deferred to a later cycle instead of waiting for tokens
+DEFERRABLE_CLASSES = frozenset({"payload", "updates"})
+# share of the link burst that bulk classes may not borrow, kept for interactive traffic
+INTERACTIVE_RESERVE = 0.25
+BURST_SECONDS = 2.0
+REQUEST_OVERHEAD_BYTES = 256
+
+
+class BandwidthDeferred(Exception):
+    """Raised when a bulk transfer has to wait for a later cycle to stay within budget."""
+
+
+class TokenBucket:
+    """Token bucket measured in bytes that may go into debt for oversized requests."""
+
+    def __init__(self, rate: float, capacity: float, clock: Clock) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock.time()
+
+    @property
+    def tokens(self) -> float:
+        now = self._clock.time()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self._tokens
+
+    def allows(self, size: float, floor: float = 0.0) -> bool:
+        # requests larger than the bucket go through once it is full above the floor
+        return self.tokens - floor >= min(size, self.capacity - floor)
+
+    def seconds_until(self, size: float) -> float:
+        missing = min(size, self.capacity) - self.tokens
+        if missing <= 0 or self.rate <= 0:
+            return 0.0
+        return missing / self.rate
+
+    def consume(self, size: float) -> None:
+        self._tokens = self.tokens - size
+
+
+class BandwidthScheduler(FleetBackendProtocol):
+    """Backend wrapper sharing a link budget between traffic classes with token buckets."""
+
+    def __init__(
+        self,
+        backend: FleetBackendProtocol,
+        link_budget_bytes_per_second: float = 0,
+        clock: Optional[Clock] = None,
+    ) -> None:
+        self._backend = backend
+        self._clock = clock or SYSTEM_CLOCK
+        self._bytes: Dict[str, int] = {name: 0 for name in TRAFFIC_WEIGHTS}
+        self._rates_since = self._clock.time()
+        self.set_link_budget(link_budget_bytes_per_second)
+
+    @property
+    def backend(self) -> FleetBackendProtocol:
+        return self._backend
+
+    @property
+    def link_budget(self) -> float:
+        return self._budget
+
+    def set_link_budget(self, link_budget_bytes_per_second: float) -> None:
+        self._budget = float(link_budget_bytes_per_second)
+        self._link = TokenBucket(self._budget, self._budget * BURST_SECONDS, self._clock)
+        total_weight = sum(TRAFFIC_WEIGHTS.values())
+        self._classes = {}
+        for name, weight in TRAFFIC_WEIGHTS.items():
+            rate = self._budget * weight / total_weight
+            self._classes[name] = TokenBucket(rate, rate * BURST_SECONDS, self._clock)
+
+    def _admit(self, traffic_class: str, size: int) -> None:
+        if self._budget > 0:
+            bucket = self._classes[traffic_class]
+            within_share = bucket.allows(size)
+            if not (within_share and self._link.allows(size)):
+                if traffic_class in DEFERRABLE_CLASSES:
+                    if not self._link.allows(size, floor=self._link.capacity * INTERACTIVE_RESERVE):
+                        raise BandwidthDeferred(f"{traffic_class} transfer of {size} bytes deferred")
+                else:
+                    self._clock.sleep(self._link.seconds_until(size))
+            if within_share:
+                # borrowed idle capacity is not charged against the class's own share
+                bucket.consume(size)
+            self._link.consume(size)
+        self._bytes[traffic_class] += size
+
+    def collect_rates(self) -> Dict[str, float]:
+        """Bytes per second sent in each class since the previous call."""
+        now = self._clock.time()
+        elapsed = now - self._rates_since
+        if elapsed <= 0:
+            return {}
+        rates = {name: sent / elapsed for name, sent in self._bytes.items()}
+        self._bytes = {name: 0 for name in TRAFFIC_WEIGHTS}
+        self._rates_since = now
+        return rates
+
+    def ping(self, site_id: str) -> bool:
+        self._bytes["commands"] += REQUEST_OVERHEAD_BYTES
+        return self._backend.ping(site_id)
+
+    def send_batch(
+        self,
+        site_id: str,
+        items: Iterable[Dict],
+        batch_token: Optional[str] = None,
+        stream_id: Optional[str] = None,
+    ) -> SyncResult:
+        items = list(items)
+        self._admit("payload", _encoded_size(items))
+        return self._backend.send_batch(site_id, items, batch_token=batch_token, stream_id=stream_id)
+
+    def fetch_commands(self, site_id: str) -> List[Dict]:
+        self._admit("commands", REQUEST_OVERHEAD_BYTES)
+        return self._backend.fetch_commands(site_id)
+
+    def get_update_manifest(self, site_id: str) -> Optional[UpdateManifest]:
+        self._admit("updates", REQUEST_OVERHEAD_BYTES)
+        return self._backend.get_update_manifest(site_id)
+
+    def post_inventory(self, site_id: str, inventory: Dict) -> None:
+        self._admit("inventory", _encoded_size(inventory))
+        self._backend.post_inventory(site_id, inventory)
+
+    def post_diagnostics(self, site_id: str, diagnostics: Dict) -> None:
+        self._admit("diagnostics", _encoded_size(diagnostics))
+        self._backend.post_diagnostics(site_id, diagnostics)
+
+    def post_metrics(self, site_id: str, metrics: Dict) -> None:
+        self._admit("metrics", _encoded_size(metrics))
+        self._backend.post_metrics(site_id, metrics)
+
+    def post_metrics_backfill(self, site_id: str, series: List[Dict]) -> None:
+        self._admit("metrics", _encoded_size(series))
+        self._backend.post_metrics_backfill(site_id, series)
+
+
+def _encoded_size(body: object) -> int:
+    return len(json.dumps(body, separators=(",", ":"), default=str)) + REQUEST_OVERHEAD_BYTES
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
 import json
+import math
 import sqlite3
 import threading
 import time
+import uuid
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from .clock import SYSTEM_CLOCK, Clock
+from .recovery import RecoveryReport, quarantine_file, quick_check, salvage_rows
+
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    from .local_query import CacheReader
 
 
 @dataclass
@@ -16,69 +24,302 @@ class CacheItem:
     created_at: float
 
 
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        size_bytes INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inflight (
+        item_id INTEGER PRIMARY KEY,
+        batch_id TEXT NOT NULL,
+        sent_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quarantine (
+        id INTEGER PRIMARY KEY,
+        payload TEXT,
+        created_at REAL,
+        reason TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS delivered (
+        id INTEGER PRIMARY KEY,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        delivered_at REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS queue_created_at ON queue (created_at)",
+    "CREATE INDEX IF NOT EXISTS delivered_created_at ON delivered (created_at)",
+    "CREATE INDEX IF NOT EXISTS delivered_delivered_at ON delivered (delivered_at)",
+)
+
+
 class OfflineCache:
     """Durable payload cache ensuring data is preserved while offline."""
 
-    def __init__(self, db_path: Path) -> None:
+    _DELETE_CHUNK = 500
+
+    def __init__(
+        self,
+        db_path: Path,
+        clock: Optional[Clock] = None,
+        integrity_check_seconds: float = 2.0,
+    ) -> None:
         self._path = db_path
+        self._clock = clock or SYSTEM_CLOCK
         self._lock = threading.Lock()
-        self._connection = sqlite3.connect(db_path)
-        self._connection.execute(
-            """
-            CREATE TABLE IF NOT EXISTS queue (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                payload TEXT NOT NULL,
-                created_at REAL NOT NULL,
-                size_bytes INTEGER NOT NULL
-            )
-            """
-        )
+        started = time.perf_counter()
+        self._recovery = RecoveryReport()
+        self._connection = self._open(integrity_check_seconds)
+        self._stream_id = self._load_stream_id()
+        row = self._connection.execute("SELECT COUNT(1), SUM(size_bytes) FROM queue").fetchone()
+        # running totals avoid rescanning the table on every ingest and cycle
+        self._count = int(row[0] or 0)
+        self._size_bytes = int(row[1] or 0)
+        row = self._connection.execute("SELECT SUM(size_bytes) FROM delivered").fetchone()
+        self._delivered_bytes = int(row[0] or 0)
+        self._recovery.in_flight_batches = {
+            batch_id: [item.id for item in items] for batch_id, items in self.in_flight_batches()
+        }
+        self._recovery.duration_seconds = time.perf_counter() - started
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # FULL: a returned append must survive power loss; WAL still avoids page rewrites
+        connection.execute("PRAGMA synchronous=FULL")
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        connection.commit()
+        return connection
+
+    def _open(self, integrity_check_seconds: float) -> sqlite3.Connection:
+        try:
+            connection = self._connect()
+            self._recovery.integrity = quick_check(connection, integrity_check_seconds)
+        except sqlite3.DatabaseError:
+            connection = None
+            self._recovery.integrity = "corrupt"
+        if self._recovery.integrity != "corrupt":
+            return connection
+        if connection is not None:
+            connection.close()
+        quarantined = quarantine_file(self._path, self._clock.time())
+        connection = self._connect()
+        _, lost = salvage_rows(quarantined, connection)
+        self._recovery.quarantined_file = quarantined
+        self._recovery.quarantined_rows = lost
+        return connection
+
+    def _load_stream_id(self) -> str:
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'stream_id'").fetchone()
+        if row:
+            return row[0]
+        stream_id = uuid.uuid4().hex
+        self._connection.execute("INSERT INTO meta (key, value) VALUES ('stream_id', ?)", (stream_id,))
         self._connection.commit()
+        return stream_id
 
     @property
     def path(self) -> Path:
         return self._path
 
+    @property
+    def stream_id(self) -> str:
+        return self._stream_id
+
+    @property
+    def recovery_report(self) -> RecoveryReport:
+        return self._recovery
+
     def append(self, payload: Dict) -> None:
         encoded = json.dumps(payload, separators=(",", ":"))
+        size_bytes = len(encoded.encode("utf-8"))
         with self._lock:
             self._connection.execute(
                 "INSERT INTO queue (payload, created_at, size_bytes) VALUES (?, ?, ?)",
-                (encoded, time.time(), len(encoded.encode("utf-8"))),
+                (encoded, self._clock.time(), size_bytes),
             )
             self._connection.commit()
+            self._count += 1
+            self._size_bytes += size_bytes
 
     def get_batch(self, limit: int) -> List[CacheItem]:
+        """Return the oldest rows that are not already part of an in-flight batch."""
         cursor = self._connection.cursor()
         cursor.execute(
-            "SELECT id, payload, created_at FROM queue ORDER BY id ASC LIMIT ?",
+            "SELECT id, payload, created_at FROM queue "
+            "WHERE id NOT IN (SELECT item_id FROM inflight) ORDER BY id ASC LIMIT ?",
             (limit,),
         )
+        items = self._decode_rows(cursor.fetchall())
+        if items is None:
+            return self.get_batch(limit)
+        return items
+
+    def mark_in_flight(self, batch_id: str, ids: Iterable[int]) -> None:
+        sent_at = self._clock.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO inflight (item_id, batch_id, sent_at) VALUES (?, ?, ?)",
+                [(item_id, batch_id, sent_at) for item_id in ids],
+            )
+            self._connection.commit()
+
+    def release_in_flight(self, batch_id: str) -> None:
+        """Return rows of a batch that were neither acknowledged nor rejected to the queue."""
+        with self._lock:
+            self._connection.execute("DELETE FROM inflight WHERE batch_id = ?", (batch_id,))
+            self._connection.commit()
+
+    def in_flight_batches(self) -> List[Tuple[str, List[CacheItem]]]:
+        """Batches sent but not yet acknowledged, oldest first."""
+        cursor = self._connection.cursor()
+        cursor.execute(
+            "SELECT q.id, q.payload, q.created_at, i.batch_id FROM inflight i "
+            "JOIN queue q ON q.id = i.item_id ORDER BY q.id ASC"
+        )
         rows = cursor.fetchall()
-        return [CacheItem(id=row[0], payload=json.loads(row[1]), created_at=row[2]) for row in rows]
+        batch_ids = {row[0]: row[3] for row in rows}
+        items = self._decode_rows([row[:3] for row in rows])
+        if items is None:
+            return self.in_flight_batches()
+        batches: Dict[str, List[CacheItem]] = {}
+        for item in items:
+            batches.setdefault(batch_ids[item.id], []).append(item)
+        return list(batches.items())
+
+    def _decode_rows(self, rows: List[Tuple]) -> Optional[List[CacheItem]]:
+        """Decode rows, quarantining undecodable ones; ``None`` means retry the query."""
+        items: List[CacheItem] = []
+        corrupt: List[int] = []
+        for row in rows:
+            try:
+                items.append(CacheItem(id=row[0], payload=json.loads(row[1]), created_at=row[2]))
+            except ValueError:
+                corrupt.append(row[0])
+        if not corrupt:
+            return items
+        self.quarantine(corrupt, "undecodable payload")
+        return items or None
+
+    def quarantine(self, ids: Iterable[int], reason: str) -> None:
+        """Move rows out of the delivery queue into the ``quarantine`` table."""
+        ids = list(ids)
+        with self._lock:
+            for start in range(0, len(ids), self._DELETE_CHUNK):
+                chunk = ids[start : start + self._DELETE_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO quarantine (id, payload, created_at, reason) "
+                    f"SELECT id, payload, created_at, ? FROM queue WHERE id IN ({placeholders})",
+                    [reason, *chunk],
+                )
+                self._delete_chunk(chunk)
+            self._connection.commit()
+
+    def quarantined_count(self) -> int:
+        cursor = self._connection.cursor()
+        cursor.execute("SELECT COUNT(1) FROM quarantine")
+        return int(cursor.fetchone()[0] or 0)
 
     def remove(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
         if not ids:
             return
         with self._lock:
-            self._connection.executemany("DELETE FROM queue WHERE id = ?", [(item_id,) for item_id in ids])
+            for start in range(0, len(ids), self._DELETE_CHUNK):
+                self._delete_chunk(ids[start : start + self._DELETE_CHUNK])
             self._connection.commit()
 
+    def mark_delivered(self, ids: Iterable[int], retain: bool = True) -> None:
+        """Remove acknowledged rows from the queue, keeping a copy for local reads if ``retain``."""
+        ids = list(ids)
+        if not ids:
+            return
+        delivered_at = self._clock.time()
+        with self._lock:
+            for start in range(0, len(ids), self._DELETE_CHUNK):
+                chunk = ids[start : start + self._DELETE_CHUNK]
+                if retain:
+                    placeholders = ",".join("?" * len(chunk))
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO delivered (id, payload, created_at, size_bytes, delivered_at) "
+                        f"SELECT id, payload, created_at, size_bytes, ? FROM queue WHERE id IN ({placeholders})",
+                        [delivered_at, *chunk],
+                    )
+                    (added,) = self._connection.execute(
+                        f"SELECT SUM(size_bytes) FROM queue WHERE id IN ({placeholders})", chunk
+                    ).fetchone()
+                    self._delivered_bytes += int(added or 0)
+                self._delete_chunk(chunk)
+            self._connection.commit()
+
+    def prune_delivered(self, older_than: float) -> int:
+        """Drop retained rows delivered before ``older_than``; returns the number removed."""
+        with self._lock:
+            removed, removed_bytes = self._connection.execute(
+                "SELECT COUNT(1), SUM(size_bytes) FROM delivered WHERE delivered_at < ?", (older_than,)
+            ).fetchone()
+            if not removed:
+                return 0
+            self._connection.execute("DELETE FROM delivered WHERE delivered_at < ?", (older_than,))
+            self._connection.commit()
+            self._delivered_bytes -= int(removed_bytes or 0)
+        return int(removed)
+
+    def delivered_size_bytes(self) -> int:
+        return self._delivered_bytes
+
+    def open_reader(self) -> CacheReader:
+        """Open a read-only query connection; see :class:`~edge_agent.local_query.CacheReader`."""
+        from .local_query import CacheReader
+
+        return CacheReader(self._path)
+
+    def _delete_chunk(self, chunk: List[int]) -> None:
+        placeholders = ",".join("?" * len(chunk))
+        removed_count, removed_bytes = self._connection.execute(
+            f"SELECT COUNT(1), SUM(size_bytes) FROM queue WHERE id IN ({placeholders})", chunk
+        ).fetchone()
+        self._connection.execute(f"DELETE FROM queue WHERE id IN ({placeholders})", chunk)
+        self._connection.execute(f"DELETE FROM inflight WHERE item_id IN ({placeholders})", chunk)
+        self._count -= int(removed_count or 0)
+        self._size_bytes -= int(removed_bytes or 0)
+
     def total_size_bytes(self) -> int:
-        cursor = self._connection.cursor()
-        cursor.execute("SELECT SUM(size_bytes) FROM queue")
-        result = cursor.fetchone()[0]
-        return int(result or 0)
+        return self._size_bytes
 
     def count(self) -> int:
-        cursor = self._connection.cursor()
-        cursor.execute("SELECT COUNT(1) FROM queue")
-        result = cursor.fetchone()[0]
-        return int(result or 0)
+        return self._count
 
     def trim_to_limit(self, limit_bytes: int) -> int:
         """Trim oldest entries until total size fits within limit."""
         removed = 0
+        # retained copies of delivered data go first, earliest delivered first
+        while self._delivered_bytes and self._size_bytes + self._delivered_bytes > limit_bytes:
+            (cutoff,) = self._connection.execute(
+                "SELECT MAX(delivered_at) FROM (SELECT delivered_at FROM delivered ORDER BY delivered_at LIMIT 50)"
+            ).fetchone()
+            if cutoff is None:
+                self._delivered_bytes = 0
+                break
+            self.prune_delivered(math.nextafter(cutoff, math.inf))
         while self.total_size_bytes() > limit_bytes:
             cursor = self._connection.cursor()
             cursor.execute("SELECT id FROM queue ORDER BY id ASC LIMIT 50")
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .startup import StartupProfile
+
+DEFAULT_CONFIG_PATH = Path("/etc/edge-agent/config.yaml")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="edge-agent", description="Run the resilient edge agent.")
+    parser.add_argument("--config", type=Path, default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--cycles", type=int, default=1000000)
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print per-module import times and time to first ingest/cycle to stderr",
+    )
+    args = parser.parse_args(argv)
+
+    profile = StartupProfile() if args.startup_profile else None
+    if profile:
+        profile.import_critical_path()
+        profile.mark("imports")
+
+    from .agent import EdgeAgent
+    from .backend import MockFleetBackend
+    from .config import ConfigError, ConfigWatcher, load_config
+
+    try:
+        config = load_config(args.config)
+    except ConfigError as exc:
+        print(f"Invalid configuration: {exc}", file=sys.stderr)
+        return 1
+    watcher = ConfigWatcher(args.config)
+    watcher.install_signal_handler()
+    if profile:
+        profile.mark("config_loaded")
+    backend = MockFleetBackend()
+    agent = EdgeAgent(config=config, backend=backend, config_watcher=watcher)
+    cycles = args.cycles
+    if profile:
+        profile.mark("ready_for_ingest")
+
+    print("Edge agent started. Press Ctrl+C to stop.")
+    try:
+        if profile:
+            if cycles > 0:
+                agent.process_cycle()
+                profile.mark("first_cycle")
+                cycles -= 1
+            print(profile.format_report(), file=sys.stderr)
+            if cycles > 0:
+                time.sleep(agent.config.sync_interval_seconds)
+        agent.run(cycles=cycles)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.close()
+    return 0
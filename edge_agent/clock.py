@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import time
+from typing import Protocol
+
+
+class Clock(Protocol):
+    """Source of wall-clock time and sleeping used by the agent runtime."""
+
+    def time(self) -> float: ...
+
+    def sleep(self, seconds: float) -> None: ...
+
+
+class SystemClock:
+    """Clock backed by the host's real time."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Manually advanced clock for deterministic simulations and tests."""
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = float(start)
+
+    def time(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        if seconds < 0:
+            raise ValueError("virtual clock cannot move backwards")
+        self._now += seconds
+
+    def advance_to(self, timestamp: float) -> None:
+        self.advance(max(0.0, timestamp - self._now))
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -1,8 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from pathlib import Path
-from typing import Optional
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+
+
+class ConfigError(ValueError):
+    """Raised when a configuration file is missing, malformed, or invalid."""
+
+
+# fields a running agent can pick up on reload; the rest identify the site or its
+# storage and need a restart
+TUNABLE_FIELDS: FrozenSet[str] = frozenset(
+    {
+        "sync_interval_seconds",
+        "max_batch_size",
+        "offline_cache_limit_bytes",
+        "delivered_retention_seconds",
+        "telemetry_push_interval_seconds",
+        "update_poll_interval_seconds",
+        "inventory_refresh_hours",
+        "diag_log_lines",
+        "link_budget_bytes_per_second",
+    }
+)
 
 
 @dataclass(frozen=True)
@@ -16,16 +37,153 @@ class AgentConfig:
     sync_interval_seconds: int = 30
     max_batch_size: int = 100
     offline_cache_limit_bytes: int = 200 * 1024 * 1024  # 200 MB
+    cache_integrity_check_seconds: float = 2.0
+    delivered_retention_seconds: int = 3600  # kept for local reads this long after delivery; 0 disables
     telemetry_push_interval_seconds: int = 60
     update_poll_interval_seconds: int = 300
     inventory_refresh_hours: int = 12
     diag_log_lines: int = 500
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_rotation_interval_seconds: int = 24 * 3600
+    log_compress_rotated: bool = True
+    log_repeat_limit: int = 10
+    link_budget_bytes_per_second: int = 0  # 0 disables shaping; 2 Mbit/s uplink = 250_000
     hostname: Optional[str] = None
     log_directory: Path = field(default_factory=lambda: Path("/var/log/edge-agent"))
     data_directory: Path = field(default_factory=lambda: Path("/var/lib/edge-agent"))
 
+    def validate(self) -> None:
+        """Raise :class:`ConfigError` if any value is out of range."""
+        for name in ("site_id", "backend_url", "secret_key"):
+            if not getattr(self, name):
+                raise ConfigError(f"{name} must not be empty")
+        if self.max_batch_size < 1:
+            raise ConfigError("max_batch_size must be at least 1")
+        for name in (
+            "sync_interval_seconds",
+            "offline_cache_limit_bytes",
+            "cache_integrity_check_seconds",
+            "delivered_retention_seconds",
+            "telemetry_push_interval_seconds",
+            "update_poll_interval_seconds",
+            "inventory_refresh_hours",
+            "diag_log_lines",
+            "log_max_bytes",
+            "log_backup_count",
+            "log_rotation_interval_seconds",
+            "log_repeat_limit",
+            "link_budget_bytes_per_second",
+        ):
+            if getattr(self, name) < 0:
+                raise ConfigError(f"{name} must not be negative")
+
     def ensure_directories(self) -> None:
         """Ensure required directories exist on disk."""
         self.cache_path.parent.mkdir(parents=True, exist_ok=True)
         self.log_directory.mkdir(parents=True, exist_ok=True)
         self.data_directory.mkdir(parents=True, exist_ok=True)
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.lower()
+    if lowered in {"true", "yes", "on", "1"}:
+        return True
+    if lowered in {"false", "no", "off", "0"}:
+        return False
+    raise ValueError(value)
+
+
+_FIELD_PARSERS = {
+    "bool": _parse_bool,
+    "str": str,
+    "int": int,
+    "float": float,
+    "Path": Path,
+    "Optional[str]": lambda value: value or None,
+}
+
+
+def parse_config_text(text: str) -> Dict[str, str]:
+    """Parse the flat ``key: value`` YAML subset used by ``/etc/edge-agent/config.yaml``."""
+    data: Dict[str, str] = {}
+    for number, raw_line in enumerate(text.splitlines(), start=1):
+        line = raw_line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        if ":" not in line:
+            raise ConfigError(f"line {number}: expected 'key: value'")
+        key, value = line.split(":", 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        data[key.strip()] = value
+    return data
+
+
+def config_from_mapping(values: Mapping[str, str]) -> AgentConfig:
+    """Build a validated :class:`AgentConfig`, coercing each value to its field type."""
+    known = {item.name: item for item in fields(AgentConfig)}
+    unknown = sorted(set(values) - set(known))
+    if unknown:
+        raise ConfigError(f"unknown config keys: {', '.join(unknown)}")
+    missing = sorted(name for name in ("site_id", "backend_url", "secret_key") if name not in values)
+    if missing:
+        raise ConfigError(f"missing required config values: {', '.join(missing)}")
+    kwargs = {}
+    if "cache_path" not in values:
+        kwargs["cache_path"] = Path(values.get("data_directory", "/var/lib/edge-agent")) / "cache.db"
+    for name, raw in values.items():
+        parser = _FIELD_PARSERS[str(known[name].type)]
+        try:
+            kwargs[name] = parser(raw)
+        except ValueError as exc:
+            raise ConfigError(f"{name}: invalid value {raw!r}") from exc
+    config = AgentConfig(**kwargs)
+    config.validate()
+    return config
+
+
+def load_config(path: Path) -> AgentConfig:
+    try:
+        text = path.read_text(encoding="utf-8")
+    except OSError as exc:
+        raise ConfigError(f"cannot read configuration at {path}: {exc}") from exc
+    return config_from_mapping(parse_config_text(text))
+
+
+class ConfigWatcher:
+    """Detects config file changes by mtime/size or SIGHUP and reloads them."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._reload_requested = False
+        self._signature = self._file_signature()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self._path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def request_reload(self, *_: object) -> None:
+        self._reload_requested = True
+
+    def install_signal_handler(self) -> None:
+        import signal
+
+        signal.signal(signal.SIGHUP, self.request_reload)
+
+    def poll(self) -> Optional[AgentConfig]:
+        """Return a new validated config if the file changed, else ``None``."""
+        signature = self._file_signature()
+        if not self._reload_requested and signature == self._signature:
+            return None
+        self._reload_requested = False
+        self._signature = signature
+        return load_config(self._path)
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import time
 from dataclasses import dataclass, field
 from typing import Optional
 
 from .backend import FleetBackendProtocol
+from .clock import SYSTEM_CLOCK, Clock
 
 
 @dataclass
@@ -21,9 +21,10 @@ class ConnectivityMonitor:
     site_id: str
     ping_timeout_seconds: int = 5
     state: ConnectivityState = field(default_factory=ConnectivityState)
+    clock: Clock = field(default=SYSTEM_CLOCK)
 
     def evaluate(self) -> ConnectivityState:
-        now = time.time()
+        now = self.clock.time()
         try:
             if self.backend.ping(self.site_id):
                 self.state.last_successful_ping = now
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SequenceRangeSet:
+    """Bounded set of sequence numbers stored as merged ``[start, end]`` ranges."""
+
+    def __init__(self, max_ranges: int = 1024) -> None:
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._max_ranges = max_ranges
+
+    def __contains__(self, value: int) -> bool:
+        index = bisect_right(self._starts, value) - 1
+        return index >= 0 and value <= self._ends[index]
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    @property
+    def ranges(self) -> List[Tuple[int, int]]:
+        return list(zip(self._starts, self._ends))
+
+    def add(self, value: int) -> bool:
+        """Record ``value``; returns ``False`` if it was already present."""
+        index = bisect_right(self._starts, value) - 1
+        if index >= 0 and value <= self._ends[index]:
+            return False
+        joins_left = index >= 0 and self._ends[index] == value - 1
+        joins_right = index + 1 < len(self._starts) and self._starts[index + 1] == value + 1
+        if joins_left and joins_right:
+            self._ends[index] = self._ends[index + 1]
+            del self._starts[index + 1]
+            del self._ends[index + 1]
+        elif joins_left:
+            self._ends[index] = value
+        elif joins_right:
+            self._starts[index + 1] = value
+        else:
+            self._starts.insert(index + 1, value)
+            self._ends.insert(index + 1, value)
+            if len(self._starts) > self._max_ranges:
+                del self._starts[0]
+                del self._ends[0]
+        return True
+
+
+class BoundedResultCache(Generic[T]):
+    """Least-recently-used map from batch idempotency tokens to their results."""
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._entries: "OrderedDict[str, T]" = OrderedDict()
+        self._capacity = capacity
+
+    def get(self, token: str) -> Optional[T]:
+        value = self._entries.get(token)
+        if value is not None:
+            self._entries.move_to_end(token)
+        return value
+
+    def put(self, token: str, value: T) -> None:
+        self._entries[token] = value
+        self._entries.move_to_end(token)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# keys that change on every collection and carry no state worth diffing
+VOLATILE_KEYS = frozenset({"timestamp"})
+
+Patch = List[Dict[str, Any]]
+
+
+class DeltaBaseMismatch(Exception):
+    """Raised by a backend whose stored document does not match a delta's base hash."""
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def content_hash(value: Any) -> str:
+    return hashlib.sha256(_canonical(value).encode("utf-8")).hexdigest()[:16]
+
+
+def stable_sections(document: Dict) -> Dict:
+    return {key: value for key, value in document.items() if key not in VOLATILE_KEYS}
+
+
+def section_hashes(document: Dict) -> Dict[str, str]:
+    return {key: content_hash(value) for key, value in stable_sections(document).items()}
+
+
+def is_delta(body: Dict) -> bool:
+    return "patch" in body and "base" in body
+
+
+def _pointer(path: str, key: Any) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+
+def diff(old: Any, new: Any, path: str = "") -> Patch:
+    """JSON-patch (RFC 6902 subset) turning ``old`` into ``new``."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: Patch = []
+        for key in old.keys() - new.keys():
+            ops.append({"op": "remove", "path": _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path, key), "value": value})
+            elif old[key] != value:
+                ops.extend(diff(old[key], value, _pointer(path, key)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        return _diff_list(old, new, path)
+    if old == new:
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def _diff_list(old: List, new: List, path: str) -> Patch:
+    if len(old) == len(new):
+        ops: Patch = []
+        for index, (before, after) in enumerate(zip(old, new)):
+            if before != after:
+                ops.extend(diff(before, after, _pointer(path, index)))
+        return ops
+    # a tail window (log lines) usually drops items at the front and appends at the back
+    if new:
+        for shift in (index for index, value in enumerate(old) if value == new[0]):
+            kept = len(old) - shift
+            if kept <= len(new) and old[shift:] == new[:kept]:
+                ops = [{"op": "remove", "path": _pointer(path, 0)} for _ in range(shift)]
+                ops.extend({"op": "add", "path": _pointer(path, "-"), "value": value} for value in new[kept:])
+                return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(document: Dict, patch: Patch) -> Dict:
+    result = copy.deepcopy(document)
+    for op in patch:
+        if op["path"] == "":
+            result = copy.deepcopy(op["value"])
+            continue
+        *parents, last = [
+            part.replace("~1", "/").replace("~0", "~") for part in op["path"].split("/")[1:]
+        ]
+        target: Any = result
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        if isinstance(target, list):
+            if op["op"] == "remove":
+                del target[int(last)]
+            elif last == "-":
+                target.append(op["value"])
+            elif op["op"] == "add":
+                target.insert(int(last), op["value"])
+            else:
+                target[int(last)] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return result
+
+
+class DeltaEncoder:
+    """Encodes documents as JSON-patch deltas against the last acknowledged copy."""
+
+    def __init__(self, state_path: Path) -> None:
+        self._state_path = state_path
+        self._baseline: Optional[Dict] = None
+        if state_path.exists():
+            try:
+                self._baseline = json.loads(state_path.read_text(encoding="utf-8"))
+            except ValueError:
+                self._baseline = None
+
+    def encode(self, document: Dict) -> Dict:
+        if self._baseline is None:
+            return document
+        current = stable_sections(document)
+        old_hashes = section_hashes(self._baseline)
+        new_hashes = section_hashes(current)
+        patch: Patch = []
+        for key in old_hashes.keys() - new_hashes.keys():
+            patch.append({"op": "remove", "path": _pointer("", key)})
+        for key, digest in new_hashes.items():
+            if old_hashes.get(key) == digest:
+                continue
+            if key not in self._baseline:
+                patch.append({"op": "add", "path": _pointer("", key), "value": current[key]})
+                continue
+            section_patch = diff(self._baseline[key], current[key], _pointer("", key))
+            replacement = [{"op": "replace", "path": _pointer("", key), "value": current[key]}]
+            patch.extend(section_patch if len(_canonical(section_patch)) < len(_canonical(replacement)) else replacement)
+        body = {"base": content_hash(self._baseline), "hash": content_hash(current), "patch": patch}
+        body.update({key: document[key] for key in VOLATILE_KEYS if key in document})
+        return body
+
+    def acknowledge(self, document: Dict) -> None:
+        self._baseline = stable_sections(document)
+        self._state_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self._state_path.with_suffix(".tmp")
+        temp_path.write_text(_canonical(self._baseline), encoding="utf-8")
+        temp_path.replace(self._state_path)
+
+    def reset(self) -> None:
+        self._baseline = None
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+_FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+
+
+def _json_path(field: str) -> str:
+    if not _FIELD_PATTERN.match(field):
+        raise ValueError(f"invalid field name {field!r}")
+    return f"$.{field}"
+
+
+class CacheReader:
+    """Read-only queries over pending and recently delivered cache rows."""
+
+    def __init__(self, db_path: Path, fetch_size: int = 500) -> None:
+        self._connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self._connection.execute("PRAGMA query_only=ON")
+        self._fetch_size = fetch_size
+
+    def _source(
+        self,
+        columns: str,
+        start: Optional[float],
+        end: Optional[float],
+        include_pending: bool,
+        include_delivered: bool,
+        parameters: Sequence[Any] = (),
+    ) -> Tuple[str, List[Any]]:
+        conditions = []
+        bounds: List[Any] = []
+        if start is not None:
+            conditions.append("created_at >= ?")
+            bounds.append(start)
+        if end is not None:
+            conditions.append("created_at < ?")
+            bounds.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        selects = []
+        values: List[Any] = []
+        for table, flag, included in (("queue", 0, include_pending), ("delivered", 1, include_delivered)):
+            if included:
+                selects.append(f"SELECT {columns}, {flag} AS delivered FROM {table}{where}")
+                values.extend([*parameters, *bounds])
+        if not selects:
+            raise ValueError("at least one of pending or delivered rows must be included")
+        return " UNION ALL ".join(selects), values
+
+    def _stream(self, sql: str, values: Sequence[Any]) -> Iterator[Tuple]:
+        cursor = self._connection.execute(sql, values)
+        try:
+            while True:
+                rows = cursor.fetchmany(self._fetch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def readings(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        fields: Optional[Sequence[str]] = None,
+        include_pending: bool = True,
+        include_delivered: bool = True,
+    ) -> Iterator[Dict]:
+        """Rows created in ``[start, end)``, oldest first, optionally projected to ``fields``."""
+        if fields:
+            paths = [_json_path(field) for field in fields]
+            columns = "id, created_at, " + ", ".join("json_extract(payload, ?)" for _ in paths)
+        else:
+            paths = []
+            columns = "id, created_at, payload"
+        source, values = self._source(columns, start, end, include_pending, include_delivered, paths)
+        for row in self._stream(f"{source} ORDER BY created_at, id", values):
+            result = {"id": row[0], "created_at": row[1], "delivered": bool(row[-1])}
+            if fields:
+                result.update(zip(fields, row[2:-1]))
+            else:
+                result["document"] = json.loads(row[2])
+            yield result
+
+    def aggregate(
+        self,
+        field: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        bucket_seconds: Optional[float] = None,
+        include_pending: bool = True,
+        include_delivered: bool = True,
+    ) -> Iterator[Dict]:
+        """Count, min, max, avg and sum of a numeric field, optionally per time bucket."""
+        source, values = self._source(
+            "created_at, json_extract(payload, ?) AS value",
+            start,
+            end,
+            include_pending,
+            include_delivered,
+            [_json_path(field)],
+        )
+        stats = "COUNT(value), MIN(value), MAX(value), AVG(value), SUM(value)"
+        if bucket_seconds:
+            sql = (
+                f"SELECT CAST(created_at / ? AS INTEGER) * ? AS bucket, {stats} "
+                f"FROM ({source}) GROUP BY bucket ORDER BY bucket"
+            )
+            values = [bucket_seconds, bucket_seconds, *values]
+        else:
+            sql = f"SELECT NULL, {stats} FROM ({source})"
+        for bucket, count, minimum, maximum, average, total in self._stream(sql, values):
+            result = {"count": count, "min": minimum, "max": maximum, "avg": average, "sum": total}
+            if bucket_seconds:
+                result["bucket_start"] = bucket
+            yield result
+
+    def close(self) -> None:
+        self._connection.close()
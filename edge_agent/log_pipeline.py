@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import os
+import queue
+import shutil
+import time
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+@dataclass
+class LoggingStats:
+    emit_seconds: float
+    records: int
+    dropped: int
+
+
+class RepeatedMessageFilter(logging.Filter):
+    """Lets at most ``limit`` records per message template through each window."""
+
+    def __init__(self, limit: int, window_seconds: float = 60.0) -> None:
+        super().__init__()
+        self._limit = limit
+        self._window = window_seconds
+        self._windows: Dict[Tuple[str, int, str], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self._limit <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self._window:
+            self._windows[key] = [now, 1, 0 if window is None else window[2]]
+            return True
+        window[1] += 1
+        if window[1] <= self._limit:
+            return True
+        window[2] += 1
+        return False
+
+    def expired_summaries(self) -> List[Tuple[Tuple[str, int, str], int]]:
+        """Pop windows that have ended and return those that suppressed records."""
+        now = time.monotonic()
+        summaries = []
+        for key, (started, _, suppressed) in list(self._windows.items()):
+            if now - started < self._window:
+                continue
+            del self._windows[key]
+            if suppressed:
+                summaries.append((key, suppressed))
+        return summaries
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller and tracks its own cost."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.emit_seconds = 0.0
+        self.records = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatted on the listener thread, so logged arguments must not be mutated later
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        started = time.perf_counter()
+        try:
+            emitted = super().handle(record)
+        finally:
+            self.emit_seconds += time.perf_counter() - started
+        if emitted:
+            self.records += 1
+        return emitted
+
+
+class RotatingLogFileHandler(RotatingFileHandler):
+    """Rotates by size or age, optionally gzip-compressing rotated files."""
+
+    def __init__(
+        self,
+        filename: Path,
+        max_bytes: int,
+        backup_count: int,
+        interval_seconds: float,
+        compress: bool,
+    ) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self._interval = interval_seconds
+        if compress:
+            self.namer = _gzip_name
+            self.rotator = _gzip_rotate
+        # the marker's mtime records when the current file was started, across restarts
+        self._marker = Path(f"{filename}.rotated")
+        self._opened_at = self._load_opened_at(Path(filename))
+
+    def _load_opened_at(self, log_file: Path) -> float:
+        if self._marker.exists():
+            return self._marker.stat().st_mtime
+        # a log written before the marker existed is at least as old as its last write
+        opened_at = log_file.stat().st_mtime if log_file.exists() else time.time()
+        self._touch_marker(opened_at)
+        return opened_at
+
+    def _touch_marker(self, timestamp: float) -> None:
+        self._marker.parent.mkdir(parents=True, exist_ok=True)
+        self._marker.touch()
+        os.utime(self._marker, (timestamp, timestamp))
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self._interval > 0 and time.time() - self._opened_at >= self._interval:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self._opened_at = time.time()
+        self._touch_marker(self._opened_at)
+
+
+def _gzip_name(name: str) -> str:
+    return f"{name}.gz"
+
+
+def _gzip_rotate(source: str, destination: str) -> None:
+    if not os.path.exists(source):
+        return
+    with open(source, "rb") as plain, gzip.open(destination, "wb") as compressed:
+        shutil.copyfileobj(plain, compressed)
+    os.remove(source)
+
+
+class LogPipeline:
+    """Asynchronous logging: callers enqueue, a listener thread formats and writes."""
+
+    def __init__(
+        self,
+        log_file: Path,
+        max_bytes: int,
+        backup_count: int,
+        interval_seconds: float,
+        compress: bool,
+        repeat_limit: int,
+        queue_size: int = 10000,
+    ) -> None:
+        file_handler = RotatingLogFileHandler(log_file, max_bytes, backup_count, interval_seconds, compress)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+        self._filter = RepeatedMessageFilter(repeat_limit)
+        self.handler = NonBlockingQueueHandler(log_queue)
+        self.handler.addFilter(self._filter)
+        self._file_handler = file_handler
+        self._listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        self._listener.start()
+
+    def collect_stats(self, logger: logging.Logger) -> LoggingStats:
+        """Emit summaries for suppressed repeats and return counters since the last call."""
+        for (name, level, message), suppressed in self._filter.expired_summaries():
+            record = logger.makeRecord(
+                name, level, "", 0, "Suppressed %d repeats of: %s", (suppressed, message), None
+            )
+            self.handler.enqueue(record)
+        stats = LoggingStats(self.handler.emit_seconds, self.handler.records, self.handler.dropped)
+        self.handler.emit_seconds = 0.0
+        self.handler.records = 0
+        self.handler.dropped = 0
+        return stats
+
+    def stop(self) -> None:
+        self._listener.stop()
+        self._file_handler.close()
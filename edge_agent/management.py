@@ -2,13 +2,13 @@ from __future__ import annotations
 
 import json
 import os
-import platform
-import socket
-import subprocess
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    from .profiler import StackSampler
 
 
 @dataclass
@@ -23,8 +23,15 @@ class RemoteManagement:
     def __init__(self, log_directory: Path, diag_log_lines: int) -> None:
         self._log_directory = log_directory
         self._diag_log_lines = diag_log_lines
+        self._profiler: Optional[StackSampler] = None
+
+    def set_diag_log_lines(self, diag_log_lines: int) -> None:
+        self._diag_log_lines = diag_log_lines
 
     def collect_inventory(self) -> Dict:
+        import platform
+        import socket
+
         return {
             "hostname": socket.gethostname(),
             "platform": platform.platform(),
@@ -73,6 +80,29 @@ class RemoteManagement:
     def cmd_fetch_inventory(self) -> Dict:
         return {"command": "fetch_inventory", "inventory": self.collect_inventory()}
 
+    def cmd_profile(self, duration_seconds: float = 10.0, interval_ms: float = 10.0) -> Dict:
+        """Start sampling the agent's threads; the profile is delivered by :meth:`finished_profiles`."""
+        if self._profiler is not None:
+            return {"command": "profile", "status": "busy"}
+        from .profiler import StackSampler
+
+        self._profiler = StackSampler(duration_seconds, interval_ms / 1000)
+        self._profiler.start()
+        return {"command": "profile", "status": "started", "duration_seconds": self._profiler.duration_seconds}
+
+    def finished_profiles(self) -> List[Dict]:
+        """Diagnostics documents for profiling runs that completed since the last call."""
+        if self._profiler is None or not self._profiler.finished:
+            return []
+        profile = self._profiler.result()
+        self._profiler = None
+        return [{"profile": profile, "timestamp": time.time()}]
+
+    def stop_profiling(self) -> None:
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler = None
+
     def capture_logs(self, limit: int = 200) -> Dict[str, List[str]]:
         result: Dict[str, List[str]] = {}
         if not self._log_directory.exists():
@@ -97,6 +127,8 @@ class RemoteManagement:
             return {"total_bytes": 0, "free_bytes": 0}
 
     def _list_processes(self) -> List[Dict]:
+        import subprocess
+
         try:
             raw = subprocess.check_output(["ps", "-eo", "pid,comm,%cpu,%mem"], text=True)  # noqa: S603, S607
         except Exception:
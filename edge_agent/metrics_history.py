@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (bucket width in seconds, number of buckets kept): 1 h of 10 s, 1 day of 1 min, 30 days of 1 h
+DEFAULT_RESOLUTIONS: Tuple[Tuple[int, int], ...] = ((10, 360), (60, 1440), (3600, 720))
+
+_MAGIC = 0x45444745  # "EDGE"
+_HEADER = struct.Struct("<IIIId")  # magic, max metrics, rings, reserved, acked_until
+_DOUBLE = 8
+
+
+class MetricsHistory:
+    """Fixed-size, memory-mapped ring of metric snapshots at several resolutions."""
+
+    def __init__(
+        self,
+        path: Path,
+        max_metrics: int = 64,
+        resolutions: Sequence[Tuple[int, int]] = DEFAULT_RESOLUTIONS,
+    ) -> None:
+        self._path = path
+        self._keys_path = path.with_name(path.name + ".keys.json")
+        self._max_metrics = max_metrics
+        self._resolutions = tuple(resolutions)
+        self._slot_doubles = 1 + max_metrics
+        slot_bytes = self._slot_doubles * _DOUBLE
+        self._ring_offsets = []
+        size = _HEADER.size
+        for _, capacity in self._resolutions:
+            self._ring_offsets.append(size)
+            size += capacity * slot_bytes
+        # one slot per ring holding its current bucket as it was when last acknowledged
+        self._ack_offset = size
+        size += len(self._resolutions) * slot_bytes
+        self._load_keys()
+        fresh = not path.exists() or path.stat().st_size != size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("ab") as handle:
+            handle.truncate(size)
+        self._file = path.open("r+b")
+        self._map = mmap.mmap(self._file.fileno(), size)
+        if fresh or _HEADER.unpack_from(self._map, 0)[:3] != (_MAGIC, max_metrics, len(self._resolutions)):
+            self._reset()
+        self.dropped_metrics = 0
+
+    def _load_keys(self) -> None:
+        self._columns: Dict[str, int] = {}
+        self._gauges: set = set()
+        if self._keys_path.exists():
+            data = json.loads(self._keys_path.read_text(encoding="utf-8"))
+            self._columns = {name: index for index, name in enumerate(data["keys"])}
+            self._gauges = set(data["gauges"])
+
+    def _save_keys(self) -> None:
+        names = sorted(self._columns, key=self._columns.__getitem__)
+        temp_path = self._keys_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps({"keys": names, "gauges": sorted(self._gauges)}), encoding="utf-8")
+        temp_path.replace(self._keys_path)
+
+    def _reset(self) -> None:
+        self._map[:] = b"\0" * len(self._map)
+        _HEADER.pack_into(self._map, 0, _MAGIC, self._max_metrics, len(self._resolutions), 0, 0.0)
+        self._map.flush()
+
+    @property
+    def finest_resolution(self) -> int:
+        return self._resolutions[0][0]
+
+    @property
+    def acked_until(self) -> float:
+        return _HEADER.unpack_from(self._map, 0)[4]
+
+    def mark_acked(self, timestamp: float) -> None:
+        magic, max_metrics, rings, reserved, _ = _HEADER.unpack_from(self._map, 0)
+        _HEADER.pack_into(self._map, 0, magic, max_metrics, rings, reserved, timestamp)
+        slot_bytes = self._slot_doubles * _DOUBLE
+        for ring, (resolution, capacity) in enumerate(self._resolutions):
+            bucket = math.floor(timestamp / resolution) * resolution
+            source = self._slot_offset(ring, bucket, resolution, capacity)
+            target = self._ack_offset + ring * slot_bytes
+            if struct.unpack_from("<d", self._map, source)[0] == bucket:
+                self._map[target : target + slot_bytes] = self._map[source : source + slot_bytes]
+            else:
+                self._clear_slot(target, bucket)
+        self._map.flush()
+
+    def record(self, metrics: Dict[str, float], gauges: Iterable[str] = ()) -> None:
+        """Roll a telemetry snapshot (with its ``timestamp``) into every resolution."""
+        timestamp = metrics["timestamp"]
+        gauge_names = set(gauges)
+        columns = []
+        for name, value in metrics.items():
+            if name == "timestamp":
+                continue
+            column = self._column_for(name, name in gauge_names)
+            if column is not None:
+                columns.append((column, float(value), name in self._gauges))
+        for ring, (resolution, capacity) in enumerate(self._resolutions):
+            bucket = math.floor(timestamp / resolution) * resolution
+            offset = self._slot_offset(ring, bucket, resolution, capacity)
+            (stored,) = struct.unpack_from("<d", self._map, offset)
+            if stored != bucket:
+                self._clear_slot(offset, bucket)
+            for column, value, is_gauge in columns:
+                position = offset + (1 + column) * _DOUBLE
+                (current,) = struct.unpack_from("<d", self._map, position)
+                if is_gauge or math.isnan(current):
+                    struct.pack_into("<d", self._map, position, value)
+                else:
+                    struct.pack_into("<d", self._map, position, current + value)
+        self._map.flush()
+
+    def _column_for(self, name: str, is_gauge: bool) -> Optional[int]:
+        column = self._columns.get(name)
+        if column is not None:
+            return column
+        if len(self._columns) >= self._max_metrics:
+            self.dropped_metrics += 1
+            return None
+        column = len(self._columns)
+        self._columns[name] = column
+        if is_gauge:
+            self._gauges.add(name)
+        self._save_keys()
+        return column
+
+    def _slot_offset(self, ring: int, bucket: float, resolution: int, capacity: int) -> int:
+        slot = int(bucket // resolution) % capacity
+        return self._ring_offsets[ring] + slot * self._slot_doubles * _DOUBLE
+
+    def _clear_slot(self, offset: int, bucket: float) -> None:
+        struct.pack_into("<d", self._map, offset, bucket)
+        nan = struct.pack("<d", math.nan)
+        self._map[offset + _DOUBLE : offset + self._slot_doubles * _DOUBLE] = nan * self._max_metrics
+
+    def buckets(self, resolution: int, start: float, end: float) -> List[Dict[str, float]]:
+        """Buckets of ``resolution`` whose start lies in ``[start, end)``, oldest first."""
+        ring = [width for width, _ in self._resolutions].index(resolution)
+        capacity = self._resolutions[ring][1]
+        names = sorted(self._columns, key=self._columns.__getitem__)
+        result = []
+        bucket = math.ceil(start / resolution) * resolution
+        while bucket < end:
+            offset = self._slot_offset(ring, bucket, resolution, capacity)
+            values = struct.unpack_from(f"<{self._slot_doubles}d", self._map, offset)
+            if values[0] == bucket:
+                entry = {name: values[1 + index] for index, name in enumerate(names) if not math.isnan(values[1 + index])}
+                if entry:
+                    entry["timestamp"] = bucket
+                    entry["resolution_seconds"] = resolution
+                    result.append(entry)
+            bucket += resolution
+        return result
+
+    def backfill(self, start: float, end: float) -> List[Dict[str, float]]:
+        """Buckets between ``start`` and ``end`` at the finest resolution still retained."""
+        coarse_to_fine = list(reversed(self._resolutions))
+        series: List[Dict[str, float]] = []
+        coarsest, coarsest_capacity = coarse_to_fine[0]
+        cursor = max(start, (math.floor(end / coarsest) - coarsest_capacity + 1) * coarsest)
+        for index, (resolution, _) in enumerate(coarse_to_fine):
+            if index + 1 < len(coarse_to_fine):
+                finer_resolution, finer_capacity = coarse_to_fine[index + 1]
+                oldest_finer = (math.floor(end / finer_resolution) - finer_capacity + 1) * finer_resolution
+                seam = min(end, max(cursor, math.ceil(oldest_finer / resolution) * resolution))
+            else:
+                seam = end
+            if seam <= cursor:
+                continue
+            first = cursor
+            if cursor == start:
+                # the bucket holding the ack was partly sent already; only its remainder is new
+                bucket = math.floor(start / resolution) * resolution
+                series.extend(self._unacked_remainder(resolution, bucket))
+                first = bucket + resolution
+            series.extend(self.buckets(resolution, first, seam))
+            cursor = seam
+        return series
+
+    def _unacked_remainder(self, resolution: int, bucket: float) -> List[Dict[str, float]]:
+        ring = [width for width, _ in self._resolutions].index(resolution)
+        capacity = self._resolutions[ring][1]
+        slot_format = f"<{self._slot_doubles}d"
+        acked = struct.unpack_from(slot_format, self._map, self._ack_offset + ring * self._slot_doubles * _DOUBLE)
+        current = struct.unpack_from(slot_format, self._map, self._slot_offset(ring, bucket, resolution, capacity))
+        if acked[0] != bucket or current[0] != bucket:
+            return []
+        entry: Dict[str, float] = {}
+        for name, column in self._columns.items():
+            value, before = current[1 + column], acked[1 + column]
+            if math.isnan(value):
+                continue
+            if name in self._gauges:
+                if math.isnan(before) or value != before:
+                    entry[name] = value
+                continue
+            delta = value if math.isnan(before) else value - before
+            if delta:
+                entry[name] = delta
+        if not entry:
+            return []
+        entry["timestamp"] = bucket
+        entry["resolution_seconds"] = resolution
+        return [entry]
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
@@ -1,35 +1,44 @@
 from __future__ import annotations
 
-import time
 from collections import defaultdict
-from typing import Dict
+from typing import Dict, FrozenSet, Optional, Set
+
+from .clock import SYSTEM_CLOCK, Clock
 
 
 class TelemetryBuffer:
     """Collects operational metrics for remote observability."""
 
-    def __init__(self) -> None:
+    def __init__(self, clock: Optional[Clock] = None) -> None:
+        self._clock = clock or SYSTEM_CLOCK
         self._metrics: Dict[str, float] = defaultdict(float)
-        self._last_flush = time.time()
+        self._gauges: Set[str] = set()
+        self._last_flush = self._clock.time()
 
     def increment(self, key: str, value: float = 1.0) -> None:
         self._metrics[key] += value
 
     def gauge(self, key: str, value: float) -> None:
         self._metrics[key] = value
+        self._gauges.add(key)
 
     def snapshot(self, include_timestamp: bool = True) -> Dict[str, float]:
         snapshot = dict(self._metrics)
         if include_timestamp:
-            snapshot["timestamp"] = time.time()
+            snapshot["timestamp"] = self._clock.time()
         return snapshot
 
     def flush(self) -> Dict[str, float]:
         data = self.snapshot()
         self._metrics.clear()
-        self._last_flush = time.time()
+        self._gauges.clear()
+        self._last_flush = self._clock.time()
         return data
 
     @property
     def seconds_since_flush(self) -> float:
-        return time.time() - self._last_flush
+        return self._clock.time() - self._last_flush
+
+    @property
+    def gauge_keys(self) -> FrozenSet[str]:
+        return frozenset(self._gauges)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional
+
+MAX_PROFILE_SECONDS = 300.0
+MIN_INTERVAL_SECONDS = 0.001
+# keeps the uploaded profile bounded; the tail of rare stacks carries little signal
+MAX_STACKS = 500
+
+
+class StackSampler:
+    """Samples every thread's stack on a background thread into collapsed-stack counts."""
+
+    def __init__(self, duration_seconds: float, interval_seconds: float = 0.01) -> None:
+        self.duration_seconds = min(max(duration_seconds, 0.0), MAX_PROFILE_SECONDS)
+        self.interval_seconds = max(interval_seconds, MIN_INTERVAL_SECONDS)
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="edge-agent-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def finished(self) -> bool:
+        return self._thread.ident is not None and not self._thread.is_alive()
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        own_id = threading.get_ident()
+        deadline = started + self.duration_seconds
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            self._sample(own_id)
+            self._stop.wait(self.interval_seconds)
+        self._elapsed = time.perf_counter() - started
+
+    def _sample(self, own_id: int) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():  # noqa: SLF001 - documented for this use
+            if thread_id == own_id:
+                continue
+            self._stacks[_collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+        self._samples += 1
+
+    def result(self) -> Dict:
+        stacks: List[str] = [f"{stack} {count}" for stack, count in self._stacks.most_common(MAX_STACKS)]
+        return {
+            "format": "collapsed",
+            "duration_seconds": round(self._elapsed, 3),
+            "interval_ms": self.interval_seconds * 1000,
+            "samples": self._samples,
+            "stacks": stacks,
+            "truncated_stacks": max(0, len(self._stacks) - MAX_STACKS),
+        }
+
+
+def _collapse(thread_name: str, frame: Optional[FrameType]) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    frames.append(thread_name)
+    return ";".join(reversed(frames)).replace(" ", "_")
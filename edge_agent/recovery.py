@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SALVAGE_WINDOW = 500
+
+
+@dataclass
+class RecoveryReport:
+    """Outcome of opening an offline cache after a restart or crash."""
+
+    integrity: str = "skipped"
+    duration_seconds: float = 0.0
+    quarantined_rows: int = 0
+    quarantined_file: Optional[Path] = None
+    in_flight_batches: Dict[str, List[int]] = field(default_factory=dict)
+
+
+def quick_check(connection: sqlite3.Connection, budget_seconds: float) -> str:
+    """Run ``PRAGMA quick_check`` bounded by ``budget_seconds``."""
+    if budget_seconds <= 0:
+        return "skipped"
+    timer = threading.Timer(budget_seconds, connection.interrupt)
+    timer.start()
+    try:
+        rows = connection.execute("PRAGMA quick_check(1)").fetchall()
+    except sqlite3.OperationalError as exc:
+        if "interrupt" in str(exc):
+            return "timeout"
+        return "corrupt"
+    except sqlite3.DatabaseError:
+        return "corrupt"
+    finally:
+        timer.cancel()
+    return "ok" if rows == [("ok",)] else "corrupt"
+
+
+def quarantine_file(db_path: Path, timestamp: float) -> Path:
+    """Move a damaged database (and its WAL/SHM siblings) out of the way."""
+    suffix = f".corrupt-{int(timestamp)}"
+    target = db_path.with_name(db_path.name + suffix)
+    for sibling in ("", "-wal", "-shm"):
+        source = db_path.with_name(db_path.name + sibling)
+        if source.exists():
+            source.rename(source.with_name(db_path.name + suffix + sibling))
+    return target
+
+
+def salvage_rows(source_path: Path, destination: sqlite3.Connection) -> Tuple[int, int]:
+    """Copy readable rows of a quarantined database into ``destination``; returns ``(copied, lost)``."""
+    try:
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    except sqlite3.DatabaseError:
+        return 0, 0
+    copied = lost = 0
+    try:
+        low, high = _id_bounds(source)
+        if low is None or high is None:
+            return 0, 0
+        for start in range(low, high + 1, SALVAGE_WINDOW):
+            end = start + SALVAGE_WINDOW - 1
+            try:
+                rows = _read_window(source, start, end)
+            except sqlite3.DatabaseError:
+                rows = []
+                for item_id in range(start, end + 1):
+                    try:
+                        rows.extend(_read_window(source, item_id, item_id))
+                    except sqlite3.DatabaseError:
+                        lost += 1
+            destination.executemany(
+                "INSERT OR IGNORE INTO queue (id, payload, created_at, size_bytes) VALUES (?, ?, ?, ?)", rows
+            )
+            copied += len(rows)
+        for table, columns in (("inflight", "item_id, batch_id, sent_at"), ("meta", "key, value")):
+            try:
+                rows = source.execute(f"SELECT {columns} FROM {table}").fetchall()
+            except sqlite3.DatabaseError:
+                continue
+            placeholders = ",".join("?" * len(columns.split(",")))
+            destination.executemany(f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({placeholders})", rows)
+        _carry_over_sequence(source, destination)
+        destination.commit()
+    finally:
+        source.close()
+    return copied, lost
+
+
+def _carry_over_sequence(source: sqlite3.Connection, destination: sqlite3.Connection) -> None:
+    # ids already delivered under the salvaged stream_id must never be handed out again
+    try:
+        row = source.execute("SELECT seq FROM sqlite_sequence WHERE name = 'queue'").fetchone()
+    except sqlite3.DatabaseError:
+        row = None
+    if not row:
+        return
+    (current,) = destination.execute("SELECT COALESCE(MAX(id), 0) FROM queue").fetchone()
+    destination.execute("DELETE FROM sqlite_sequence WHERE name = 'queue'")
+    destination.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('queue', ?)", (max(row[0], current),))
+
+
+def _id_bounds(source: sqlite3.Connection) -> Tuple[Optional[int], Optional[int]]:
+    try:
+        return source.execute("SELECT MIN(id), MAX(id) FROM queue").fetchone()
+    except sqlite3.DatabaseError:
+        pass
+    # a damaged btree edge can break MIN/MAX; the AUTOINCREMENT counter bounds the ids too
+    try:
+        row = source.execute("SELECT seq FROM sqlite_sequence WHERE name = 'queue'").fetchone()
+    except sqlite3.DatabaseError:
+        return None, None
+    return (1, row[0]) if row else (None, None)
+
+
+def _read_window(source: sqlite3.Connection, start: int, end: int) -> List[Tuple]:
+    return source.execute(
+        "SELECT id, payload, created_at, size_bytes FROM queue WHERE id BETWEEN ? AND ?",
+        (start, end),
+    ).fetchall()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, Optional
+
+# modules on the path from process start to the first accepted payload
+CRITICAL_PATH_MODULES = (
+    "edge_agent.clock",
+    "edge_agent.config",
+    "edge_agent.backend",
+    "edge_agent.cache",
+    "edge_agent.monitoring",
+    "edge_agent.connectivity",
+    "edge_agent.update",
+    "edge_agent.agent",
+)
+
+
+class StartupProfile:
+    """Records import and initialization timings for the ``--startup-profile`` flag."""
+
+    def __init__(self) -> None:
+        self._origin = time.perf_counter()
+        self._process_age = _process_age_seconds()
+        self.imports_ms: Dict[str, float] = {}
+        self.phases_ms: Dict[str, float] = {}
+
+    def import_module(self, name: str) -> ModuleType:
+        if name in sys.modules:
+            self.imports_ms.setdefault(name, 0.0)
+            return sys.modules[name]
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports_ms[name] = (time.perf_counter() - start) * 1000
+        return module
+
+    def import_critical_path(self) -> None:
+        for name in CRITICAL_PATH_MODULES:
+            self.import_module(name)
+
+    def mark(self, phase: str) -> float:
+        elapsed = (time.perf_counter() - self._origin) * 1000
+        self.phases_ms[phase] = elapsed
+        return elapsed
+
+    def report(self) -> Dict:
+        return {
+            "interpreter_startup_ms": None if self._process_age is None else round(self._process_age * 1000, 2),
+            "imports_ms": {name: round(value, 3) for name, value in self.imports_ms.items()},
+            "phases_ms": {name: round(value, 3) for name, value in self.phases_ms.items()},
+            "lazy_modules_loaded": sorted(
+                name for name in ("edge_agent.management", "logging", "subprocess") if name in sys.modules
+            ),
+        }
+
+    def format_report(self) -> str:
+        return json.dumps(self.report(), indent=2)
+
+
+def _process_age_seconds() -> Optional[float]:
+    """Seconds since the process was started, from procfs where available."""
+    try:
+        stat = Path("/proc/self/stat").read_text()
+        uptime = float(Path("/proc/uptime").read_text().split()[0])
+    except (OSError, ValueError):
+        return None
+    # fields after the parenthesised command name; starttime is field 22 overall
+    fields = stat.rsplit(")", 1)[1].split()
+    start_ticks = int(fields[19])
+    return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
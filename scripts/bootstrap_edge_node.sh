@@ -76,6 +76,7 @@ Type=simple
 User=edge
 Group=edge
 ExecStart=/usr/local/bin/edge-agent
+ExecReload=/bin/kill -HUP $MAINPID
 Restart=on-failure
 RestartSec=5
 
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from edge_agent.cache import OfflineCache  # noqa: E402
+
+PAGE_SIZE = 4096
+
+
+def fill_cache(path: Path, size_mb: float, payload_bytes: int) -> int:
+    """Populate ``path`` with roughly ``size_mb`` of queued payloads and one in-flight batch."""
+    OfflineCache(path, integrity_check_seconds=0).close()
+    connection = sqlite3.connect(path)
+    encoded = json.dumps({"payload": {"padding": "x" * payload_bytes}}, separators=(",", ":"))
+    rows = int(size_mb * 1024 * 1024 // len(encoded))
+    now = time.time()
+    connection.executemany(
+        "INSERT INTO queue (payload, created_at, size_bytes) VALUES (?, ?, ?)",
+        ((encoded, now, len(encoded)) for _ in range(rows)),
+    )
+    connection.executemany(
+        "INSERT INTO inflight (item_id, batch_id, sent_at) VALUES (?, ?, ?)",
+        ((item_id, "benchmark-batch", now) for item_id in range(1, 101)),
+    )
+    connection.commit()
+    connection.close()
+    return rows
+
+
+def corrupt_pages(path: Path, pages: int) -> None:
+    """Overwrite ``pages`` pages in the middle of the file with garbage."""
+    size = path.stat().st_size
+    with path.open("r+b") as handle:
+        for index in range(pages):
+            handle.seek((size // 2 // PAGE_SIZE + index * 7) * PAGE_SIZE)
+            handle.write(b"\xde\xad\xbe\xef" * (PAGE_SIZE // 4))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure offline cache recovery time after a restart.")
+    parser.add_argument("--size-mb", type=float, default=200.0)
+    parser.add_argument("--payload-bytes", type=int, default=1024)
+    parser.add_argument("--budget", type=float, default=2.0, help="integrity check budget in seconds")
+    parser.add_argument("--corrupt-pages", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with TemporaryDirectory() as tmp:
+        path = Path(tmp) / "cache.db"
+        rows = fill_cache(path, args.size_mb, args.payload_bytes)
+        size_mib = path.stat().st_size / 1024 / 1024
+        if args.corrupt_pages:
+            corrupt_pages(path, args.corrupt_pages)
+        started = time.perf_counter()
+        cache = OfflineCache(path, integrity_check_seconds=args.budget)
+        elapsed = time.perf_counter() - started
+        report = cache.recovery_report
+        print(f"Rows written: {rows} ({size_mib:.1f} MiB on disk)")
+        print(f"Integrity check: {report.integrity}")
+        print(f"Recovery time: {elapsed * 1000:.1f} ms")
+        print(f"Rows recovered: {cache.count()}, lost: {report.quarantined_rows}")
+        print(f"In-flight batches to resend: {len(report.in_flight_batches)}")
+        if report.quarantined_file is not None:
+            print(f"Quarantined file: {report.quarantined_file.name}")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
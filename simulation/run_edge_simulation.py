@@ -1,16 +1,108 @@
 from __future__ import annotations
 
+import argparse
+import heapq
+import json
 import random
-import time
+import sys
+from dataclasses import dataclass, field
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from typing import List, Optional, Sequence, Tuple
 
-from edge_agent.agent import EdgeAgent
-from edge_agent.backend import MockFleetBackend
-from edge_agent.config import AgentConfig
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from edge_agent.agent import EdgeAgent  # noqa: E402
+from edge_agent.backend import MockFleetBackend  # noqa: E402
+from edge_agent.cache import OfflineCache  # noqa: E402
+from edge_agent.clock import VirtualClock  # noqa: E402
+from edge_agent.config import AgentConfig  # noqa: E402
 
-def _build_config(root: Path) -> AgentConfig:
+SIMULATION_EPOCH = 1_700_000_000.0
+IN_MEMORY_CACHE = Path(":memory:")
+
+# event priorities: connectivity changes apply before ingest, ingest before the agent cycle
+_OUTAGE_START, _OUTAGE_END, _INGEST, _CYCLE = range(4)
+
+
+@dataclass(frozen=True)
+class OutageWindow:
+    start_seconds: float
+    end_seconds: float
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.end_seconds - self.start_seconds
+
+
+@dataclass(frozen=True)
+class IngestProfile:
+    events_per_second: float = 1.0
+    payload_padding_bytes: int = 0
+    poisson: bool = True
+
+
+@dataclass
+class OutageOutcome:
+    window: OutageWindow
+    trimmed_after_seconds: Optional[float] = None
+
+
+@dataclass
+class SimulationReport:
+    simulated_seconds: float
+    events_ingested: int
+    events_delivered: int
+    events_rejected: int
+    events_trimmed: int
+    peak_cache_bytes: int
+    metric_buckets_backfilled: int
+    outages: List[OutageOutcome] = field(default_factory=list)
+
+    @property
+    def first_trim_hours(self) -> Optional[float]:
+        for outcome in self.outages:
+            if outcome.trimmed_after_seconds is not None:
+                return outcome.trimmed_after_seconds / 3600
+        return None
+
+
+def merge_outage_windows(windows: Sequence[OutageWindow]) -> List[OutageWindow]:
+    """Sort windows and merge overlapping or touching ones into a single outage."""
+    merged: List[OutageWindow] = []
+    for window in sorted(windows, key=lambda item: item.start_seconds):
+        if window.end_seconds < window.start_seconds:
+            raise ValueError(f"outage window ends before it starts: {window}")
+        if merged and window.start_seconds <= merged[-1].end_seconds:
+            last = merged.pop()
+            window = OutageWindow(last.start_seconds, max(last.end_seconds, window.end_seconds))
+        merged.append(window)
+    return merged
+
+
+def load_outage_trace(path: Path) -> List[OutageWindow]:
+    """Load ``[[start_seconds, end_seconds], ...]`` pairs relative to simulation start."""
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    return merge_outage_windows([OutageWindow(float(start), float(end)) for start, end in raw])
+
+
+def generate_outage_trace(
+    duration_seconds: float,
+    mean_uptime_seconds: float,
+    mean_outage_seconds: float,
+    seed: int,
+) -> List[OutageWindow]:
+    rng = random.Random(seed)
+    windows: List[OutageWindow] = []
+    cursor = rng.expovariate(1 / mean_uptime_seconds)
+    while cursor < duration_seconds:
+        end = min(duration_seconds, cursor + rng.expovariate(1 / mean_outage_seconds))
+        windows.append(OutageWindow(cursor, end))
+        cursor = end + rng.expovariate(1 / mean_uptime_seconds)
+    return windows
+
+
+def _build_config(root: Path, sync_interval_seconds: int, cache_limit_bytes: int) -> AgentConfig:
     return AgentConfig(
         site_id="simulated-site",
         backend_url="https://backend.simulated",
@@ -18,42 +110,198 @@ def _build_config(root: Path) -> AgentConfig:
         cache_path=root / "cache.db",
         log_directory=root / "logs",
         data_directory=root / "data",
-        sync_interval_seconds=0,
-        telemetry_push_interval_seconds=5,
-        update_poll_interval_seconds=10,
-        inventory_refresh_hours=0,
+        sync_interval_seconds=sync_interval_seconds,
+        offline_cache_limit_bytes=cache_limit_bytes,
+        telemetry_push_interval_seconds=60,
+        update_poll_interval_seconds=300,
     )
 
 
-def run_simulation(cycles: int = 10) -> None:
-    backend = MockFleetBackend()
-    with TemporaryDirectory() as tmp:
-        base = Path(tmp)
-        agent = EdgeAgent(config=_build_config(base), backend=backend)
-        for cycle in range(cycles):
-            if cycle == 2:
-                backend.set_online(False)
-            if cycle == 5:
-                backend.set_online(True)
-            payload = {
-                "temperature": round(random.uniform(18.0, 24.0), 2),
-                "humidity": round(random.uniform(30.0, 45.0), 1),
-                "cycle": cycle,
-            }
-            agent.ingest_payload(payload)
-            agent.process_cycle()
-            time.sleep(0.1)
-        agent.close()
-    _report_results(backend)
-
-
-def _report_results(backend: MockFleetBackend) -> None:
+class EdgeSimulation:
+    """Discrete-event simulation of one site driven by a virtual clock."""
+
+    def __init__(
+        self,
+        outages: Sequence[OutageWindow],
+        profile: IngestProfile,
+        duration_seconds: float,
+        seed: int = 0,
+        sync_interval_seconds: int = 30,
+        cache_limit_bytes: int = 200 * 1024 * 1024,
+        stop_on_trim: bool = False,
+    ) -> None:
+        self._outages = merge_outage_windows(outages)
+        self._profile = profile
+        self._duration = duration_seconds
+        self._seed = seed
+        self._sync_interval = sync_interval_seconds
+        self._cache_limit = cache_limit_bytes
+        self._stop_on_trim = stop_on_trim
+
+    def run(self) -> SimulationReport:
+        rng = random.Random(self._seed)
+        clock = VirtualClock(start=SIMULATION_EPOCH)
+        backend = MockFleetBackend(seed=self._seed, clock=clock)
+        outcomes = [OutageOutcome(window) for window in self._outages]
+        with TemporaryDirectory() as tmp:
+            config = _build_config(Path(tmp), self._sync_interval, self._cache_limit)
+            cache = OfflineCache(IN_MEMORY_CACHE, clock=clock)
+            agent = EdgeAgent(config=config, backend=backend, cache=cache, clock=clock)
+            queue: List[Tuple[float, int, int, int]] = []
+            sequence = 0
+
+            def schedule(offset: float, kind: int, index: int = -1) -> None:
+                nonlocal sequence
+                if offset <= self._duration:
+                    heapq.heappush(queue, (offset, kind, sequence, index))
+                    sequence += 1
+
+            for index, window in enumerate(self._outages):
+                schedule(window.start_seconds, _OUTAGE_START, index)
+                schedule(window.end_seconds, _OUTAGE_END, index)
+            if self._profile.events_per_second > 0:
+                schedule(self._next_arrival(rng), _INGEST)
+            schedule(0.0, _CYCLE)
+
+            active_outage: Optional[int] = None
+            ingested = 0
+            peak_bytes = 0
+            while queue:
+                offset, kind, _, index = heapq.heappop(queue)
+                clock.advance_to(SIMULATION_EPOCH + offset)
+                if kind == _OUTAGE_START:
+                    backend.set_online(False)
+                    active_outage = index
+                elif kind == _OUTAGE_END:
+                    backend.set_online(True)
+                    active_outage = None
+                elif kind == _INGEST:
+                    agent.ingest_payload(self._payload(rng, ingested))
+                    ingested += 1
+                    schedule(offset + self._next_arrival(rng), _INGEST)
+                else:
+                    trimmed_before = agent.state.trimmed_events
+                    agent.process_cycle()
+                    peak_bytes = max(peak_bytes, cache.total_size_bytes())
+                    if agent.state.trimmed_events > trimmed_before and active_outage is not None:
+                        outcome = outcomes[active_outage]
+                        if outcome.trimmed_after_seconds is None:
+                            outcome.trimmed_after_seconds = offset - outcome.window.start_seconds
+                            if self._stop_on_trim:
+                                break
+                    schedule(offset + self._sync_interval, _CYCLE)
+
+            report = SimulationReport(
+                simulated_seconds=clock.time() - SIMULATION_EPOCH,
+                events_ingested=ingested,
+                events_delivered=len(backend.received_batches),
+                events_rejected=agent.state.rejected_events,
+                events_trimmed=agent.state.trimmed_events,
+                peak_cache_bytes=peak_bytes,
+                metric_buckets_backfilled=len(backend.received_metrics_backfill),
+                outages=outcomes,
+            )
+            agent.close()
+        return report
+
+    def _next_arrival(self, rng: random.Random) -> float:
+        if self._profile.poisson:
+            return rng.expovariate(self._profile.events_per_second)
+        return 1 / self._profile.events_per_second
+
+    def _payload(self, rng: random.Random, sequence: int) -> dict:
+        payload = {
+            "temperature": round(rng.uniform(18.0, 24.0), 2),
+            "humidity": round(rng.uniform(30.0, 45.0), 1),
+            "sequence": sequence,
+        }
+        if self._profile.payload_padding_bytes:
+            payload["padding"] = "x" * self._profile.payload_padding_bytes
+        return payload
+
+
+def measure_outage_survival(
+    profile: IngestProfile,
+    cache_limit_bytes: int,
+    max_hours: float = 24 * 7,
+    seed: int = 0,
+    sync_interval_seconds: int = 30,
+) -> Optional[float]:
+    """Return hours of continuous outage survived before the cache starts trimming."""
+    duration = max_hours * 3600
+    simulation = EdgeSimulation(
+        outages=[OutageWindow(0.0, duration)],
+        profile=profile,
+        duration_seconds=duration,
+        seed=seed,
+        sync_interval_seconds=sync_interval_seconds,
+        cache_limit_bytes=cache_limit_bytes,
+        stop_on_trim=True,
+    )
+    return simulation.run().first_trim_hours
+
+
+def _report_results(report: SimulationReport) -> None:
     print("=== Simulation Summary ===")
-    print(f"Measurements delivered: {len(backend.received_batches)}")
-    print(f"Inventory syncs: {len(backend.received_inventory)}")
-    print(f"Diagnostics captured: {len(backend.received_diagnostics)}")
-    print(f"Metrics pushed: {len(backend.received_metrics)}")
+    print(f"Simulated time: {report.simulated_seconds / 3600:.1f}h")
+    print(f"Measurements ingested: {report.events_ingested}")
+    print(f"Measurements delivered: {report.events_delivered}")
+    print(f"Measurements rejected: {report.events_rejected}")
+    print(f"Measurements trimmed: {report.events_trimmed}")
+    print(f"Peak cache size: {report.peak_cache_bytes / 1024:.1f} KiB")
+    print(f"Metric buckets backfilled after outages: {report.metric_buckets_backfilled}")
+    print(f"Outages: {len(report.outages)}")
+    for outcome in report.outages:
+        window = outcome.window
+        trimmed = (
+            f"trimmed after {outcome.trimmed_after_seconds / 3600:.2f}h"
+            if outcome.trimmed_after_seconds is not None
+            else "no trimming"
+        )
+        print(f"  {window.start_seconds / 3600:8.2f}h  {window.duration_seconds / 3600:6.2f}h  {trimmed}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay outage traces against a simulated edge agent.")
+    parser.add_argument("--trace", type=Path, help="JSON list of [start_seconds, end_seconds] outage windows")
+    parser.add_argument("--hours", type=float, default=24 * 7, help="simulated duration")
+    parser.add_argument("--rate", type=float, default=0.2, help="ingested events per second")
+    parser.add_argument("--padding", type=int, default=0, help="extra payload bytes per event")
+    parser.add_argument("--cache-limit-mb", type=float, default=200.0)
+    parser.add_argument("--sync-interval", type=int, default=30)
+    parser.add_argument("--mean-uptime-hours", type=float, default=36.0)
+    parser.add_argument("--mean-outage-hours", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--survival", action="store_true", help="report hours of outage survived before trimming")
+    args = parser.parse_args(argv)
+
+    profile = IngestProfile(events_per_second=args.rate, payload_padding_bytes=args.padding)
+    cache_limit = int(args.cache_limit_mb * 1024 * 1024)
+    if args.survival:
+        hours = measure_outage_survival(profile, cache_limit, args.hours, args.seed, args.sync_interval)
+        if hours is None:
+            print(f"No trimming within {args.hours:.1f}h of outage at {args.rate} events/s")
+        else:
+            print(f"Cache starts trimming after {hours:.2f}h of outage at {args.rate} events/s")
+        return
+
+    duration = args.hours * 3600
+    if args.trace:
+        outages = load_outage_trace(args.trace)
+    else:
+        outages = generate_outage_trace(
+            duration, args.mean_uptime_hours * 3600, args.mean_outage_hours * 3600, args.seed
+        )
+    simulation = EdgeSimulation(
+        outages=outages,
+        profile=profile,
+        duration_seconds=duration,
+        seed=args.seed,
+        sync_interval_seconds=args.sync_interval,
+        cache_limit_bytes=cache_limit,
+    )
+    _report_results(simulation.run())
 
 
 if __name__ == "__main__":
-    run_simulation()
+    main()
@@ -1,16 +1,34 @@
 from __future__ import annotations
 
+import gzip
 import hashlib
 import hmac
 import json
+import logging
+import os
+import sqlite3
 import time
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
 from edge_agent.agent import EdgeAgent
 from edge_agent.backend import MockFleetBackend, UpdateManifest
-from edge_agent.config import AgentConfig
+from edge_agent.cache import OfflineCache
+from edge_agent.cli import main as cli_main
+from edge_agent.clock import VirtualClock
+from edge_agent.config import AgentConfig, ConfigError, ConfigWatcher, load_config
+from edge_agent.dedup import SequenceRangeSet
+from edge_agent.delta import apply_patch, diff
+from edge_agent.log_pipeline import LogPipeline, RotatingLogFileHandler
+from edge_agent.recovery import salvage_rows
 from edge_agent.update import UpdateState
+from simulation.run_edge_simulation import (
+    EdgeSimulation,
+    IngestProfile,
+    OutageWindow,
+    load_outage_trace,
+    measure_outage_survival,
+)
 
 
 def _build_config(base: Path, **overrides):
@@ -90,6 +108,526 @@ def test_remote_management_executes_commands_and_stores_results(tmp_path):
     agent.close()
 
 
+def test_virtual_clock_drives_offline_duration_and_trimming(tmp_path):
+    clock = VirtualClock(start=1_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    config = _build_config(tmp_path, offline_cache_limit_bytes=400)
+    agent = EdgeAgent(config=config, backend=backend, clock=clock)
+    backend.set_online(False)
+    agent.process_cycle()
+    assert agent.state.offline_since == 1_000.0
+    for reading in range(10):
+        agent.ingest_payload({"reading": reading})
+    clock.advance(3600)
+    agent.process_cycle()
+    assert agent.state.trimmed_events > 0
+    assert agent.state.events_cached < 10
+    backend.set_online(True)
+    agent.process_cycle()
+    assert backend.received_metrics[-1]["offline_duration_seconds"] == 3600
+    assert backend.received_metrics[-1]["timestamp"] == 4_600.0
+    agent.close()
+
+
+def test_mock_backend_rejections_are_reproducible_with_seed():
+    items = [{"id": index} for index in range(200)]
+    first = MockFleetBackend(rejection_rate=0.1, seed=7).send_batch("site", items)
+    second = MockFleetBackend(rejection_rate=0.1, seed=7).send_batch("site", items)
+    assert first.rejected
+    assert first == second
+
+
+def test_simulation_is_reproducible_for_a_seed():
+    def run():
+        return EdgeSimulation(
+            outages=[OutageWindow(1800, 5400), OutageWindow(9000, 9600)],
+            profile=IngestProfile(events_per_second=0.5),
+            duration_seconds=4 * 3600,
+            seed=7,
+        ).run()
+
+    first = run()
+    assert first == run()
+    assert first.events_delivered > 0 and len(first.outages) == 2
+
+
+def test_outage_survival_matches_hand_computed_trim_time():
+    # each envelope is 2173 bytes, so 1 MiB overflows with the 483rd event at t=483 s
+    # and the first 30 s cycle after that, at t=510 s, trims
+    profile = IngestProfile(events_per_second=1.0, payload_padding_bytes=2000, poisson=False)
+    hours = measure_outage_survival(profile, cache_limit_bytes=1024 * 1024, max_hours=1)
+    assert round(hours * 3600) == 510
+
+
+def test_overlapping_outage_windows_are_merged(tmp_path):
+    trace = tmp_path / "trace.json"
+    trace.write_text(json.dumps([[1800, 7200], [0, 3600], [8000, 9000]]))
+    assert load_outage_trace(trace) == [OutageWindow(0, 7200), OutageWindow(8000, 9000)]
+
+
+def test_agent_defers_subsystems_until_first_use(tmp_path):
+    backend = MockFleetBackend(rejection_rate=0.0)
+    config = _build_config(tmp_path)
+    agent = EdgeAgent(config=config, backend=backend)
+    agent.ingest_payload({"temperature": 20.1})
+    assert agent.state.events_cached == 1
+    assert not config.log_directory.exists()
+    assert not (config.data_directory / "updates").exists()
+    assert agent.current_version == "0.0.0"
+    agent.close()
+
+
+def test_cli_startup_profile_reports_time_to_first_ingest(tmp_path, capsys):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "\n".join(
+            [
+                "site_id: site-123",
+                "backend_url: https://backend.example.com",
+                "secret_key: super-secret",
+                f"cache_path: {tmp_path / 'cache.db'}",
+                f"log_directory: {tmp_path / 'logs'}",
+                f"data_directory: {tmp_path / 'data'}",
+            ]
+        )
+    )
+    assert cli_main(["--config", str(config_file), "--cycles", "0", "--startup-profile"]) == 0
+    report = json.loads(capsys.readouterr().err)
+    assert "edge_agent.agent" in report["imports_ms"]
+    assert report["phases_ms"]["ready_for_ingest"] >= report["phases_ms"]["imports"]
+    assert cli_main(["--config", str(tmp_path / "missing.yaml"), "--cycles", "0"]) == 1
+
+
+def test_unacknowledged_batches_are_resent_first_after_restart(tmp_path):
+    config = _build_config(tmp_path)
+    cache = OfflineCache(config.cache_path)
+    for reading in range(5):
+        cache.append({"payload": {"reading": reading}})
+    in_flight_ids = [item.id for item in cache.get_batch(2)]
+    cache.mark_in_flight("batch-1", in_flight_ids)
+    cache.close()
+
+    reopened = OfflineCache(config.cache_path)
+    assert reopened.recovery_report.integrity == "ok"
+    assert reopened.recovery_report.in_flight_batches == {"batch-1": in_flight_ids}
+    assert [item.id for item in reopened.get_batch(10)] == [3, 4, 5]
+    backend = MockFleetBackend(rejection_rate=0.0)
+    agent = EdgeAgent(config=config, backend=backend, cache=reopened)
+    agent.process_cycle()
+    assert [item["id"] for item in backend.received_batches] == [1, 2, 3, 4, 5]
+    assert reopened.in_flight_batches() == []
+    agent.close()
+
+
+def test_corrupt_cache_is_quarantined_instead_of_failing_startup(tmp_path):
+    cache_path = tmp_path / "cache.db"
+    cache_path.write_bytes(b"not a sqlite database" * 100)
+    cache = OfflineCache(cache_path)
+    report = cache.recovery_report
+    assert report.integrity == "corrupt"
+    assert report.quarantined_file is not None and report.quarantined_file.exists()
+    cache.append({"payload": {"reading": 1}})
+    assert cache.count() == 1
+    cache.close()
+
+    # an agent must also start on a damaged file and report what was quarantined
+    cache_path.write_bytes(b"not a sqlite database" * 100)
+    agent = EdgeAgent(config=_build_config(tmp_path), backend=MockFleetBackend())
+    assert agent.telemetry.snapshot()["cache_rows_quarantined"] == 0
+    agent.close()
+    assert "failed integrity check" in (tmp_path / "logs" / "edge-agent.log").read_text()
+
+
+def test_lost_acknowledgement_does_not_duplicate_delivery(tmp_path):
+    config = _build_config(tmp_path)
+    backend = MockFleetBackend(rejection_rate=0.0)
+    agent = EdgeAgent(config=config, backend=backend)
+    for reading in range(3):
+        agent.ingest_payload({"reading": reading})
+    cache = OfflineCache(config.cache_path)
+    batch = cache.get_batch(10)
+    cache.mark_in_flight("batch-1", [item.id for item in batch])
+    items = [dict(item.payload, id=item.id) for item in batch]
+    # delivered, but the acknowledgement never reached the agent
+    backend.send_batch(config.site_id, items, batch_token="batch-1", stream_id=cache.stream_id)
+    backend.send_batch(config.site_id, items[:2], batch_token="retry-without-token-reuse", stream_id=cache.stream_id)
+    cache.close()
+    agent.close()
+
+    restarted = EdgeAgent(config=config, backend=backend)
+    restarted.process_cycle()
+    assert [item["payload"]["reading"] for item in backend.received_batches] == [0, 1, 2]
+    assert backend.replayed_batches == 1
+    assert backend.duplicates_dropped == 2
+    assert restarted.state.events_cached == 0
+    restarted.close()
+
+
+def test_salvaged_cache_never_reuses_delivered_sequence_numbers(tmp_path):
+    backend = MockFleetBackend(rejection_rate=0.0)
+    damaged = OfflineCache(tmp_path / "damaged.db")
+    for reading in range(10):
+        damaged.append({"reading": reading})
+    delivered = damaged.get_batch(10)[5:]
+    backend.send_batch("site", [dict(item.payload, id=item.id) for item in delivered], stream_id=damaged.stream_id)
+    damaged.remove(item.id for item in delivered)
+    damaged.close()
+
+    OfflineCache(tmp_path / "salvaged.db").close()
+    with sqlite3.connect(tmp_path / "salvaged.db") as connection:
+        connection.execute("DELETE FROM meta")
+        assert salvage_rows(tmp_path / "damaged.db", connection) == (5, 0)
+    salvaged = OfflineCache(tmp_path / "salvaged.db")
+    salvaged.append({"reading": 10})
+    newest = salvaged.get_batch(10)[-1]
+    assert newest.id == 11
+    backend.send_batch("site", [dict(newest.payload, id=newest.id)], stream_id=salvaged.stream_id)
+    assert backend.duplicates_dropped == 0
+    salvaged.close()
+
+
+def test_sequence_range_set_merges_contiguous_ranges():
+    seen = SequenceRangeSet(max_ranges=3)
+    for value in (1, 2, 3, 7, 5, 6):
+        assert seen.add(value)
+    assert not seen.add(6)
+    assert seen.ranges == [(1, 3), (5, 7)]
+    assert seen.add(4)
+    assert seen.ranges == [(1, 7)]
+    for value in (10, 20, 30):
+        seen.add(value)
+    assert seen.ranges == [(10, 10), (20, 20), (30, 30)]
+    assert 3 not in seen
+
+
+def test_typed_loader_covers_tuning_fields_and_validates(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "site_id: site-123\n"
+        "backend_url: https://backend.example.com\n"
+        "secret_key: 'super-secret'  # quoted\n"
+        "max_batch_size: 250\n"
+        "offline_cache_limit_bytes: 1_048_576\n"
+        "cache_integrity_check_seconds: 0.5\n"
+    )
+    config = load_config(config_file)
+    assert config.max_batch_size == 250
+    assert config.offline_cache_limit_bytes == 1_048_576
+    assert config.cache_integrity_check_seconds == 0.5
+    assert config.secret_key == "super-secret"
+    assert config.cache_path == Path("/var/lib/edge-agent/cache.db")
+    for bad_line in ("max_batch_size: 0", "max_batch_size: many", "max_batch: 10"):
+        config_file.write_text("site_id: a\nbackend_url: b\nsecret_key: c\n" + bad_line + "\n")
+        try:
+            load_config(config_file)
+        except ConfigError:
+            continue
+        raise AssertionError(f"{bad_line!r} should be rejected")
+
+
+def test_running_agent_hot_reloads_tunable_settings(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    base_lines = [
+        "site_id: site-123",
+        "backend_url: https://backend.example.com",
+        "secret_key: super-secret",
+        f"cache_path: {tmp_path / 'cache.db'}",
+        f"log_directory: {tmp_path / 'logs'}",
+        f"data_directory: {tmp_path / 'data'}",
+    ]
+    config_file.write_text("\n".join(base_lines))
+    watcher = ConfigWatcher(config_file)
+    backend = MockFleetBackend(rejection_rate=0.0)
+    agent = EdgeAgent(config=load_config(config_file), backend=backend, config_watcher=watcher)
+    backend.set_online(False)
+
+    config_file.write_text("\n".join(base_lines + ["max_batch_size: 7", "site_id: renamed"]))
+    watcher.request_reload()
+    agent.process_cycle()
+    assert agent.config.max_batch_size == 7
+    assert agent.config.site_id == "site-123"
+
+    config_file.write_text("\n".join(base_lines + ["max_batch_size: -1"]))
+    watcher.request_reload()
+    agent.process_cycle()
+    assert agent.config.max_batch_size == 7
+    agent.close()
+
+
+def test_log_pipeline_rotates_compresses_and_limits_repeats(tmp_path):
+    log_file = tmp_path / "edge-agent.log"
+    pipeline = LogPipeline(
+        log_file, max_bytes=2048, backup_count=2, interval_seconds=0, compress=True, repeat_limit=3
+    )
+    logger = logging.getLogger("edge_agent.test_pipeline")
+    logger.propagate = False
+    logger.addHandler(pipeline.handler)
+    for index in range(20):
+        logger.warning("repeated warning %d", index)
+    for index in range(200):
+        logger.warning(f"unique-{index} {'x' * 40}")
+    stats = pipeline.collect_stats(logger)
+    logger.removeHandler(pipeline.handler)
+    pipeline.stop()
+    assert stats.records == 203
+    assert stats.dropped == 0
+    rotated = tmp_path / "edge-agent.log.1.gz"
+    assert rotated.exists()
+    assert not (tmp_path / "edge-agent.log.3.gz").exists()
+    assert "unique-" in gzip.decompress(rotated.read_bytes()).decode()
+    assert log_file.stat().st_size <= 2048
+
+
+def test_age_based_log_rotation_survives_restarts(tmp_path):
+    log_file = tmp_path / "edge-agent.log"
+    log_file.write_text("written three days ago\n")
+    three_days_ago = time.time() - 3 * 86400
+    os.utime(log_file, (three_days_ago, three_days_ago))
+
+    def emit_once() -> None:
+        handler = RotatingLogFileHandler(log_file, 0, 3, interval_seconds=86400, compress=False)
+        handler.handle(logging.makeLogRecord({"msg": "after restart", "levelno": logging.INFO}))
+        handler.close()
+
+    emit_once()
+    assert (tmp_path / "edge-agent.log.1").read_text() == "written three days ago\n"
+    emit_once()
+    assert not (tmp_path / "edge-agent.log.2").exists()
+    # a restart a day after the last rotation still rotates, even though the file is fresh
+    marker = tmp_path / "edge-agent.log.rotated"
+    os.utime(marker, (time.time() - 86401, time.time() - 86401))
+    emit_once()
+    assert (tmp_path / "edge-agent.log.2").exists()
+
+
+def test_agent_logging_is_asynchronous_and_measured(tmp_path):
+    config = _build_config(tmp_path)
+    backend = MockFleetBackend()
+    agent = EdgeAgent(config=config, backend=backend)
+    backend.set_online(False)
+    agent.process_cycle()
+    assert "log_emit_ms_per_cycle" in agent.telemetry.snapshot()
+    agent.close()
+    assert "Connectivity lost" in (config.log_directory / "edge-agent.log").read_text()
+
+
+def test_agents_in_one_process_log_to_their_own_files(tmp_path):
+    first = EdgeAgent(config=_build_config(tmp_path / "first"), backend=MockFleetBackend())
+    offline = MockFleetBackend()
+    offline.set_online(False)
+    second = EdgeAgent(config=_build_config(tmp_path / "second"), backend=offline)
+    first.process_cycle()
+    second.process_cycle()
+    first.close()
+    second.close()
+    first_log = (tmp_path / "first" / "logs" / "edge-agent.log").read_text()
+    second_log = (tmp_path / "second" / "logs" / "edge-agent.log").read_text()
+    assert "Inventory sync completed" in first_log and "Connectivity lost" not in first_log
+    assert "Connectivity lost" in second_log and "Inventory sync completed" not in second_log
+
+
+def test_metrics_recorded_offline_are_backfilled_after_restart(tmp_path):
+    clock = VirtualClock(start=1_700_000_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    config = _build_config(tmp_path)
+    agent = EdgeAgent(config=config, backend=backend, clock=clock)
+    agent.process_cycle()
+    backend.set_online(False)
+    for _ in range(120):
+        clock.advance(60)
+        agent.ingest_payload({"temperature": 21.0})
+        agent.process_cycle()
+    agent.close()
+
+    restarted = EdgeAgent(config=config, backend=backend, clock=clock)
+    backend.set_online(True)
+    clock.advance(60)
+    restarted.process_cycle()
+    backfill = backend.received_metrics_backfill
+    assert {bucket["resolution_seconds"] for bucket in backfill} == {10, 60}
+    assert sum(bucket.get("events_ingested", 0) for bucket in backfill) == 120
+    assert backfill[0]["timestamp"] > 1_700_000_000.0
+    restarted.process_cycle()
+    assert len(backend.received_metrics_backfill) == len(backfill)
+    restarted.close()
+
+
+def test_backfill_after_outage_longer_than_a_day_keeps_the_acked_hour(tmp_path):
+    # acked 800 s into an hour: the rest of that hour is only held by the 1 h ring
+    clock = VirtualClock(start=1_700_000_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    agent = EdgeAgent(config=_build_config(tmp_path), backend=backend, clock=clock)
+    agent.ingest_payload({"temperature": 20.0})
+    agent.process_cycle()
+    backend.set_online(False)
+    for _ in range(26 * 60):
+        clock.advance(60)
+        agent.ingest_payload({"temperature": 21.0})
+        agent.process_cycle()
+    backend.set_online(True)
+    clock.advance(60)
+    agent.process_cycle()
+    backfill = backend.received_metrics_backfill
+    assert sum(bucket.get("events_ingested", 0) for bucket in backfill) == 26 * 60
+    acked_hour = 1_700_000_000.0 - 800
+    (partial,) = [bucket for bucket in backfill if bucket["timestamp"] == acked_hour]
+    assert partial["resolution_seconds"] == 3600 and partial["events_ingested"] == 46
+    agent.close()
+
+
+def test_bandwidth_budget_throttles_backlog_but_not_commands(tmp_path):
+    clock = VirtualClock(start=1_700_000_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    config = _build_config(tmp_path, link_budget_bytes_per_second=20_000, sync_interval_seconds=30)
+    agent = EdgeAgent(config=config, backend=backend, clock=clock)
+    for reading in range(2000):
+        agent.ingest_payload({"reading": reading})
+    backend.queue_command({"command": "capture_logs", "parameters": {"limit": 1}})
+    agent.process_cycle()
+    assert 0 < len(backend.received_batches) < 2000
+    assert (config.data_directory / "command-results.json").exists()
+    assert backend.received_metrics[-1]["payload_batches_deferred"] == 1
+    burst_allowance = 2 * 20_000 / config.sync_interval_seconds
+    for _ in range(40):
+        clock.advance(config.sync_interval_seconds)
+        agent.process_cycle()
+        assert agent.telemetry.snapshot()["bandwidth_payload_bytes_per_second"] <= 20_000 + burst_allowance
+    assert len(backend.received_batches) == 2000
+    agent.close()
+
+
+def test_delta_patch_round_trips_shifted_log_tail():
+    old = {"logs": {"agent.log": ["a", "b", "c", "d"]}, "disk": {"free": 10, "total": 20}, "gone": 1}
+    new = {"logs": {"agent.log": ["c", "d", "e"]}, "disk": {"free": 8, "total": 20}, "new/key": [1]}
+    patch = diff(old, new)
+    assert apply_patch(old, patch) == new
+    assert not any(op.get("value") == ["c", "d", "e"] for op in patch)
+
+
+def test_inventory_and_diagnostics_upload_deltas_and_resync_on_mismatch(tmp_path):
+    clock = VirtualClock(start=1_700_000_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    agent = EdgeAgent(config=_build_config(tmp_path), backend=backend, clock=clock)
+    sizes = []
+    for _ in range(3):
+        clock.advance(30)
+        backend.queue_command({"command": "run_diagnostic"})
+        agent.process_cycle()
+        sizes.append(agent.telemetry.snapshot()["bandwidth_diagnostics_bytes_per_second"])
+    assert backend.delta_uploads >= 4
+    assert sizes[1] < sizes[0] and sizes[2] < sizes[0]
+    assert backend.received_inventory[-1]["hostname"] == backend.received_inventory[0]["hostname"]
+    assert "processes" in backend.received_diagnostics[-1]
+    agent.close()
+
+    backend.forget_documents("site-123")
+    restarted = EdgeAgent(config=_build_config(tmp_path), backend=backend, clock=clock)
+    restarted.process_cycle()
+    assert backend.received_metrics[-1]["inventory_full_resyncs"] == 1
+    assert "hostname" in backend.received_inventory[-1]
+    restarted.close()
+
+
+def test_profile_command_uploads_collapsed_stacks_and_cycle_phases_are_timed(tmp_path):
+    backend = MockFleetBackend(rejection_rate=0.0)
+    config = _build_config(tmp_path)
+    agent = EdgeAgent(config=config, backend=backend)
+    backend.queue_command({"command": "run_diagnostic"})
+    backend.queue_command({"command": "profile", "parameters": {"duration_seconds": 0.2, "interval_ms": 5}})
+    agent.process_cycle()
+    deadline = time.monotonic() + 5
+    while not any("profile" in item for item in backend.received_diagnostics) and time.monotonic() < deadline:
+        agent.ingest_payload({"temperature": 20.0})
+        agent.process_cycle()
+    profile = backend.received_diagnostics[-1]["profile"]
+    assert profile["format"] == "collapsed" and profile["samples"] > 0
+    main_stacks = [line.rsplit(" ", 1) for line in profile["stacks"] if line.startswith("MainThread;")]
+    assert main_stacks and all(int(count) > 0 for _, count in main_stacks)
+    phases = backend.received_metrics[-1]
+    assert {"cycle_flush_ms", "cycle_inventory_ms", "cycle_commands_ms", "cycle_total_ms"} <= phases.keys()
+
+    # the profile is a one-off report and leaves the diagnostics delta baseline alone
+    baseline = json.loads((config.data_directory / "diagnostics-acked.json").read_text())
+    assert set(baseline) == {"processes", "disk_usage", "logs"}
+    deltas_before = backend.delta_uploads
+    backend.queue_command({"command": "run_diagnostic"})
+    agent.process_cycle()
+    assert backend.delta_uploads >= deltas_before + 1
+    assert "processes" in backend.received_diagnostics[-1]
+    assert all("diagnostics_full_resyncs" not in metrics for metrics in backend.received_metrics)
+    agent.close()
+
+
+def test_profile_survives_reload_of_diagnostic_settings(tmp_path):
+    backend = MockFleetBackend(rejection_rate=0.0)
+    config = _build_config(tmp_path)
+    agent = EdgeAgent(config=config, backend=backend)
+    backend.queue_command({"command": "profile", "parameters": {"duration_seconds": 0.1, "interval_ms": 5}})
+    agent.process_cycle()
+    assert agent.apply_config(_build_config(tmp_path, diag_log_lines=5)) == ["diag_log_lines"]
+    deadline = time.monotonic() + 5
+    while not any("profile" in item for item in backend.received_diagnostics) and time.monotonic() < deadline:
+        agent.process_cycle()
+    assert any("profile" in item for item in backend.received_diagnostics)
+    (config.log_directory / "extra.log").write_text("\n".join(f"line {index}" for index in range(20)))
+    backend.queue_command({"command": "run_diagnostic"})
+    agent.process_cycle()
+    assert backend.received_diagnostics[-1]["logs"]["extra.log"] == [f"line {index}" for index in range(15, 20)]
+    agent.close()
+
+
+def test_local_reader_queries_pending_and_retained_rows_while_agent_runs(tmp_path):
+    clock = VirtualClock(start=1_700_000_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    config = _build_config(tmp_path, delivered_retention_seconds=600)
+    agent = EdgeAgent(config=config, backend=backend, clock=clock)
+    for reading in range(10):
+        agent.ingest_payload({"temperature": 20.0 + reading, "humidity": 40})
+        clock.advance(60)
+        if reading == 4:
+            agent.process_cycle()
+    reader = agent.open_local_reader()
+    rows = reader.readings(start=1_700_000_000.0 + 120, fields=["payload.temperature"])
+    first = next(rows)
+    assert first == {"id": 3, "created_at": 1_700_000_120.0, "delivered": True, "payload.temperature": 22.0}
+    agent.ingest_payload({"temperature": 99.0})
+    assert [row["payload.temperature"] for row in rows] == [23.0, 24.0, 25.0, 26.0, 27.0, 28.0, 29.0]
+    (summary,) = reader.aggregate("payload.temperature", include_pending=False)
+    assert summary["count"] == 5 and summary["max"] == 24.0
+    buckets = list(reader.aggregate("payload.temperature", end=1_700_000_600.0, bucket_seconds=300))
+    assert [bucket["count"] for bucket in buckets] == [2, 5, 3]
+    assert all(bucket["bucket_start"] % 300 == 0 for bucket in buckets)
+
+    clock.advance(600)
+    agent.process_cycle()
+    retained = [row["id"] for row in reader.readings(include_pending=False)]
+    assert retained and min(retained) > 5
+    reader.close()
+    agent.close()
+
+
+def test_backlog_delivered_after_long_outage_stays_readable_for_retention(tmp_path):
+    clock = VirtualClock(start=1_700_000_000.0)
+    backend = MockFleetBackend(rejection_rate=0.0, clock=clock)
+    agent = EdgeAgent(config=_build_config(tmp_path, delivered_retention_seconds=600), backend=backend, clock=clock)
+    backend.set_online(False)
+    for reading in range(120):
+        agent.ingest_payload({"reading": reading})
+        clock.advance(60)
+        agent.process_cycle()
+    backend.set_online(True)
+    agent.process_cycle()
+    clock.advance(30)
+    agent.process_cycle()
+    reader = agent.open_local_reader()
+    assert len(list(reader.readings(include_pending=False))) == 120
+    clock.advance(600)
+    agent.process_cycle()
+    assert list(reader.readings(include_pending=False)) == []
+    reader.close()
+    agent.close()
+
+
 def _manifest(secret: str, version: str, timestamp: float) -> UpdateManifest:
     artifact_url = f"https://cdn.example.com/{version}/artifact.tar.gz"
     payload = f"{version}:{artifact_url}:{timestamp}".encode()